@@ -1,7 +1,44 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import asyncio
+import os
+import weakref
 from fastapi import APIRouter
 import json
 from aiogram import Router
+from cachetools import TTLCache
+from .logging_setup import log
+
+FALLBACK_REPLY = "Не знаю эту команду"
+
+# Echo router configuration does not depend on the spec, so it is built once (read-only)
+ECHO_ROUTER_CONFIG = {
+    "type": "echo_router",
+    "handlers": [
+        {
+            "pattern": ".*",
+            "action": "echo",
+            "response": "Echo: {user_message}"
+        }
+    ],
+    "fallback": {
+        "action": "echo",
+        "response": "Echo fallback: {user_message}"
+    }
+}
+
+# HTTP methods a JSONB route may declare; others are skipped
+ROUTE_METHODS = frozenset({"GET", "POST", "PUT", "DELETE"})
+
+# Latest config per bot, shared by preview and webhook; reload drops the entry through invalidate_spec().
+# The cache is per process: with several workers only the one serving /bots/{id}/reload forgets
+# the old spec, the others keep serving it until BOT_CONFIG_TTL seconds pass, so keep it short
+_bot_config_cache = TTLCache(maxsize=1024, ttl=float(os.getenv("BOT_CONFIG_TTL", "30")))
+
+# One loader in flight per bot; entries vanish once no request holds the lock
+_bot_config_locks = weakref.WeakValueDictionary()
+
+# Compiled {cmd: reply} tables, keyed by id(spec); the entry keeps the spec alive so the id stays valid
+_compiled_specs = TTLCache(maxsize=256, ttl=600)
 
 class DSLEngine:
     def __init__(self):
@@ -14,22 +51,6 @@ class DSLEngine:
             intents = spec_json.get("intents", [])
             flows = spec_json.get("flows", [])
 
-            # Create simple echo router configuration
-            echo_router = {
-                "type": "echo_router",
-                "handlers": [
-                    {
-                        "pattern": ".*",
-                        "action": "echo",
-                        "response": "Echo: {user_message}"
-                    }
-                ],
-                "fallback": {
-                    "action": "echo",
-                    "response": "Echo fallback: {user_message}"
-                }
-            }
-
             # Return router configuration with meta info
             return {
                 "status": "ok",
@@ -37,7 +58,7 @@ class DSLEngine:
                 "router_type": "echo",
                 "intents_count": len(intents),
                 "flows_count": len(flows),
-                "router_config": echo_router,
+                "router_config": ECHO_ROUTER_CONFIG,
                 "message": "Echo router built successfully"
             }
         except Exception as e:
@@ -76,14 +97,8 @@ class DSLEngine:
             return {"message": f"Handler for {method} {path}", "config": handler_config}
 
         # Add route to router
-        if method == "GET":
-            router.get(path)(dynamic_handler)
-        elif method == "POST":
-            router.post(path)(dynamic_handler)
-        elif method == "PUT":
-            router.put(path)(dynamic_handler)
-        elif method == "DELETE":
-            router.delete(path)(dynamic_handler)
+        if method in ROUTE_METHODS:
+            router.add_api_route(path, dynamic_handler, methods=[method])
 
     def validate_jsonb_config(self, jsonb_config: str) -> tuple[bool, str]:
         """Validate JSONB configuration"""
@@ -110,23 +125,64 @@ class DSLEngine:
         except Exception as e:
             return False, f"Validation error: {str(e)}"
 
-async def load_spec(bot_id: str) -> Dict[str, Any]:
-    """Load spec for bot - using the existing loader"""
-    from .loader import BotLoader
-    from .main import async_session
+async def load_bot_config(bot_id: str) -> Optional[Dict[str, Any]]:
+    """Load latest bot config (spec, token, version), cached per bot_id"""
+    bot_config = _bot_config_cache.get(bot_id)
+    if bot_config is not None:
+        return bot_config
+
+    lock = _bot_config_locks.get(bot_id)
+    if lock is None:
+        lock = _bot_config_locks[bot_id] = asyncio.Lock()
+
+    async with lock:
+        # A concurrent request may have loaded it while we waited
+        bot_config = _bot_config_cache.get(bot_id)
+        if bot_config is not None:
+            return bot_config
+
+        from .loader import BotLoader
+        from .main import async_session
+
+        loader = BotLoader()
+        async with async_session() as session:
+            bot_config = await loader.load_spec_by_bot_id(session, bot_id)
+            if bot_config:
+                # Misses are not cached, so a bot that appears (or a DB that recovers) is seen at once
+                _bot_config_cache[bot_id] = bot_config
+            return bot_config
 
-    loader = BotLoader()
-    async with async_session() as session:
-        bot_config = await loader.load_spec_by_bot_id(session, bot_id)
-        if bot_config:
-            return bot_config["spec_json"]
-        return {}
+async def load_spec(bot_id: str) -> Dict[str, Any]:
+    """Load spec for bot - using the existing loader, cached per bot_id"""
+    bot_config = await load_bot_config(bot_id)
+    return bot_config["spec_json"] if bot_config else {}
+
+def invalidate_spec(bot_id: str):
+    """Drop this process's cached config for bot so its next load reads the database"""
+    _bot_config_cache.pop(bot_id, None)
+
+def compile_spec(spec: Dict[str, Any]) -> Dict[str, str]:
+    """Build {cmd: reply} lookup table for spec, once per spec object"""
+    entry = _compiled_specs.get(id(spec))
+    if entry is not None and entry[0] is spec:
+        return entry[1]
+
+    table = {}
+    for i, intent in enumerate(spec.get("intents", [])):
+        if not isinstance(intent, dict) or "cmd" not in intent:
+            continue
+        if not isinstance(intent["cmd"], str) or not isinstance(intent.get("reply"), str):
+            # Reported once here; at request time the cmd just falls back instead of raising
+            log.warning("spec_intent_skipped", index=i, cmd=intent["cmd"], reason="cmd and reply must be strings")
+            continue
+        table.setdefault(intent["cmd"], intent["reply"])  # first intent for a cmd wins
+
+    _compiled_specs[id(spec)] = (spec, table)
+    return table
 
 def handle_with_spec(spec: Dict[str, Any], text: str) -> str:
-    """Pure function: handle text with given spec (for unit tests)"""
-    reply = next((i["reply"] for i in spec.get("intents", [])
-                  if i.get("cmd") == text), "Не знаю эту команду")
-    return reply
+    """Handle text with given spec, no DB access; the compiled table is cached per spec and skipped intents are logged"""
+    return compile_spec(spec).get(text, FALLBACK_REPLY)
 
 async def handle(bot_id: str, text: str) -> str:
     """Handle incoming text for bot"""
@@ -134,19 +190,34 @@ async def handle(bot_id: str, text: str) -> str:
     return handle_with_spec(spec, text)
 
 def build_router(spec) -> Router:
-    """Build aiogram Router from spec_json"""
+    """Build aiogram Router from spec_json: one handler, command looked up in a dict"""
     r = Router()
+    from aiogram import Bot
     from aiogram.types import Message
-    from aiogram.filters import Command
-
-    def add_cmd(cmd: str, reply: str):
-        cmd_name = cmd.lstrip('/')
-        @r.message(Command(commands=[cmd_name]))
-        async def _(m: Message, _reply=reply):
-            await m.answer(_reply)
-
-    for it in spec.get("intents", []):
-        if "cmd" in it:
-            add_cmd(it["cmd"], it.get("reply", ""))
 
-    return r
\ No newline at end of file
+    # Same validated table as preview, keyed by command name without the slash
+    replies = {}
+    for cmd, reply in compile_spec(spec).items():
+        replies.setdefault(cmd.lstrip('/'), reply)  # first intent for a cmd wins
+
+    async def match_command(m: Message, bot: Bot):
+        # Same matching as aiogram's Command filter: "/cmd", "/cmd@bot", "/cmd args"
+        text = m.text or m.caption
+        if not text or text[0] != "/":
+            return False
+        command, _, mention = text.split(maxsplit=1)[0][1:].partition("@")
+        reply = replies.get(command)
+        if reply is None:
+            return False
+        if mention:
+            # Like aiogram's Command filter, a bot without a username accepts any mention
+            username = (await bot.me()).username
+            if username and mention.lower() != username.lower():
+                return False
+        return {"reply": reply}
+
+    @r.message(match_command)
+    async def _(m: Message, reply: str):
+        await m.answer(reply)
+
+    return r
@@ -1,5 +1,9 @@
 """Unified HTTP error handling"""
 from fastapi import HTTPException
+import re
+
+# Errors whose message mentions the database are reported as 503
+_DB_ERROR_RE = re.compile(r"db|database", re.IGNORECASE)
 
 def fail(code: int, name: str, msg: str = "", **details):
     """Raise HTTPException with consistent error format"""
@@ -9,4 +13,16 @@ def fail(code: int, name: str, msg: str = "", **details):
             "message": msg,
             "details": details
         }
-    })
\ No newline at end of file
+    })
+
+def is_db_error(e: Exception) -> bool:
+    """Check if exception message points at the database"""
+    return _DB_ERROR_RE.search(str(e)) is not None
+
+def fail_unexpected(e: Exception):
+    """Raise 503 for database errors, 400 for missing keys, 500 otherwise"""
+    if is_db_error(e):
+        fail(503, "db_unavailable", "Database connection failed")
+    if isinstance(e, KeyError):
+        fail(400, "bad_request", "Invalid input data", field=str(e))
+    fail(500, "internal", "Internal server error", detail=str(e))
@@ -2,6 +2,23 @@ from typing import Optional, Dict, Any
 from sqlalchemy import text
 import json
 
+# Statements are built once; psycopg prepares them server-side after prepare_threshold uses
+SPEC_BY_VERSION_SQL = text("""
+    SELECT bs.spec_json, bs.version, b.name, b.token, b.status
+    FROM bot_specs bs
+    JOIN bots b ON b.id = bs.bot_id
+    WHERE bs.bot_id = :bot_id AND bs.version = :version
+""")
+
+LATEST_SPEC_SQL = text("""
+    SELECT bs.spec_json, bs.version, b.name, b.token, b.status
+    FROM bot_specs bs
+    JOIN bots b ON b.id = bs.bot_id
+    WHERE bs.bot_id = :bot_id
+    ORDER BY bs.version DESC
+    LIMIT 1
+""")
+
 class BotLoader:
     def __init__(self):
         pass
@@ -11,24 +28,10 @@ class BotLoader:
         try:
             if version is not None:
                 # Load specific version
-                query = text("""
-                    SELECT bs.spec_json, bs.version, b.name, b.token, b.status
-                    FROM bot_specs bs
-                    JOIN bots b ON b.id = bs.bot_id
-                    WHERE bs.bot_id = :bot_id AND bs.version = :version
-                """)
-                result = await session.execute(query, {"bot_id": bot_id, "version": version})
+                result = await session.execute(SPEC_BY_VERSION_SQL, {"bot_id": bot_id, "version": version})
             else:
                 # Load latest version
-                query = text("""
-                    SELECT bs.spec_json, bs.version, b.name, b.token, b.status
-                    FROM bot_specs bs
-                    JOIN bots b ON b.id = bs.bot_id
-                    WHERE bs.bot_id = :bot_id
-                    ORDER BY bs.version DESC
-                    LIMIT 1
-                """)
-                result = await session.execute(query, {"bot_id": bot_id})
+                result = await session.execute(LATEST_SPEC_SQL, {"bot_id": bot_id})
 
             row = result.fetchone()
             if row:
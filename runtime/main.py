@@ -1,59 +1,157 @@
 from fastapi import FastAPI, HTTPException, Response
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from time import perf_counter_ns
+from typing import Optional
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
 import os
+from cachetools import TTLCache
 from .registry import BotRegistry
 from .loader import BotLoader
 from .dsl_engine import DSLEngine
+from . import dsl_engine as dsl  # module attribute access keeps handle/load_spec patchable
 from prometheus_client import generate_latest
 from .logging_setup import log, bind_ctx, mask_sensitive_data  # импорт даёт конфиг
-from .schemas import PreviewRequest, BotReplyResponse
-
-app = FastAPI()
+from .schemas import PreviewRequest, BotReplyResponse, HealthResponse, HealthDBResponse, ReloadResponse, WebhookResponse
+from .logging import with_trace
+from .http_errors import fail, fail_unexpected, is_db_error
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """On shutdown finish in-flight webhook updates, then close bot sessions"""
+    yield
+    await drain_updates()
+    await close_bots()
+
+app = FastAPI(lifespan=lifespan)
 registry = BotRegistry()
 loader = BotLoader()
 dsl_engine = DSLEngine()
 
 # Initialize metrics by importing them
-from .telemetry import updates, lat, webhook_lat, errors
+from .telemetry import updates, lat, webhook_lat, webhook_handle_lat, errors, errors_for, measured_preview, measured_webhook
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg://dev:dev@pg:5432/botfactory")
-engine = create_async_engine(DATABASE_URL)
+
+def _prepare_threshold_from_env():
+    """Read DB_PREPARE_THRESHOLD: executions before psycopg prepares a statement, 'none' disables"""
+    raw = os.getenv("DB_PREPARE_THRESHOLD", "1")
+    if raw.strip().lower() == "none":
+        return None
+    try:
+        value = int(raw)
+    except ValueError:
+        raise RuntimeError(f"DB_PREPARE_THRESHOLD must be a non-negative integer or 'none', got {raw!r}") from None
+    if value < 0:
+        raise RuntimeError(f"DB_PREPARE_THRESHOLD must be a non-negative integer or 'none', got {raw!r}")
+    return value
+
+# psycopg prepares a statement once it has run prepare_threshold times on a connection:
+# 1 prepares it on the second execution (0 would on the first, psycopg's default 5 on the sixth).
+# The app runs a few statements over and over per pooled connection, so preparing early
+# pays off; none disables it, e.g. behind a transaction-pooling proxy
+engine = create_async_engine(
+    DATABASE_URL,
+    connect_args={"prepare_threshold": _prepare_threshold_from_env()}
+)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 # Simple cache for invalidation demo
 bot_cache = {}
-from cachetools import TTLCache
 router_cache = TTLCache(maxsize=256, ttl=600)  # 256 ботов, 10 минут
 
-async def get_router(bot_id: str):
-    """Get cached router for bot_id, rebuild if not cached"""
-    # Load spec to get version
-    async with async_session() as session:
-        bot_config = await loader.load_spec_by_bot_id(session, bot_id)
-        if not bot_config:
-            return None
-
-        # Use (bot_id, version) as cache key
-        spec_version = bot_config.get("version", 1)
-        cache_key = f"{bot_id}:{spec_version}"
-
-        if cache_key in router_cache:
-            return router_cache[cache_key]
-
-        # Build router and cache it
-        from .dsl_engine import build_router
-        router = build_router(bot_config["spec_json"])
-        router_cache[cache_key] = router
-        return router
+def get_dispatcher(bot_config: dict):
+    """Get cached Dispatcher for the bot spec version, build it on first use"""
+    # Use (bot_id, version) as cache key
+    spec_version = bot_config.get("version", 1)
+    cache_key = f"{bot_config['bot_id']}:{spec_version}"
+
+    dp = router_cache.get(cache_key)
+    if dp is None:
+        # A Router can be attached to one Dispatcher only, so cache the Dispatcher
+        dp = Dispatcher()
+        dp.include_router(dsl.build_router(bot_config["spec_json"]))
+        router_cache[cache_key] = dp
+    return dp
+
+# One Bot (and its HTTP session) per token, not a new one per update. Least recently used
+# first, capped so rotated tokens and deleted bots do not keep sessions open forever
+BOT_INSTANCES_MAX = 10_000
+bot_instances = OrderedDict()
+_closing_sessions = set()
+
+def get_bot(token: str) -> Bot:
+    """Get the Bot for a token, create it on first use and evict the least recently used"""
+    bot = bot_instances.get(token)
+    if bot is not None:
+        bot_instances.move_to_end(token)
+        return bot
+    bot = bot_instances[token] = Bot(token=token)
+    while len(bot_instances) > BOT_INSTANCES_MAX:
+        _, evicted = bot_instances.popitem(last=False)
+        # A handler still holding the evicted Bot gets a fresh session on its next request
+        task = asyncio.create_task(evicted.session.close())
+        _closing_sessions.add(task)
+        task.add_done_callback(_closing_sessions.discard)
+    return bot
+
+async def close_bots():
+    """Close the HTTP sessions of pooled bots and of bots still being evicted"""
+    for bot in bot_instances.values():
+        await bot.session.close()
+    bot_instances.clear()
+    if _closing_sessions:
+        await asyncio.gather(*_closing_sessions, return_exceptions=True)
+
+# Webhook updates are fed to aiogram after the 200 is sent. Each one runs in its own task
+# right away, so capping the tasks in flight caps concurrency and memory; past the cap the
+# webhook answers 503 and Telegram redelivers the update later
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "64"))
+_update_tasks = set()
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+async def feed_update_logged(bot_id: str, dp, bot, update):
+    """Feed update to the dispatcher, recording handling latency and logging failures"""
+    t = perf_counter_ns()
+    try:
+        await dp.feed_update(bot, update)
+    except Exception as e:
+        errors_for(bot_id, "webhook", "500").inc()
+        log.error("webhook_update_failed", bot_id=bot_id, error=str(e))
+    finally:
+        webhook_handle_lat.observe((perf_counter_ns() - t) / 1_000_000)
+
+def schedule_update(bot_id: str, dp, bot, update) -> Optional[asyncio.Task]:
+    """Process update in the background, keeping a reference until it finishes; None when at capacity"""
+    if len(_update_tasks) >= WEBHOOK_CONCURRENCY:
+        return None
+    task = asyncio.create_task(feed_update_logged(bot_id, dp, bot, update))
+    _update_tasks.add(task)
+    task.add_done_callback(_update_tasks.discard)
+    return task
+
+async def drain_updates(timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+    """Wait for scheduled updates (already acknowledged to Telegram), cancel the rest after timeout"""
+    loop = asyncio.get_running_loop()
+    pending = [t for t in _update_tasks if t.get_loop() is loop]
+    if not pending:
+        return
+    try:
+        await asyncio.wait_for(asyncio.gather(*pending, return_exceptions=True), timeout)
+    except asyncio.TimeoutError:
+        log.warning("webhook_updates_abandoned", count=sum(t.cancelled() for t in pending), timeout=timeout)
 
-@app.get("/health")
+# Declared response models are serialized straight to JSON bytes by Pydantic
+@app.get("/health", response_model=HealthResponse)
 def health(): return {"ok": True}
 
-@app.get("/health/db")
+@app.get("/health/db", response_model=HealthDBResponse)
 async def health_db():
-    from fastapi import Response
     try:
         async with async_session() as session:
             db_status = await registry.db_ok(session)
@@ -66,8 +164,6 @@ async def health_db():
 @app.get("/bots/{bot_id}")
 async def get_bot_spec(bot_id: str):
     """Get bot spec_json by ID"""
-    from .http_errors import fail
-
     try:
         async with async_session() as session:
             bot_config = await loader.load_spec_by_bot_id(session, bot_id)
@@ -84,20 +180,24 @@ async def get_bot_spec(bot_id: str):
     except HTTPException:
         raise  # Re-raise HTTP exceptions as-is
     except Exception as e:
-        if "db" in str(e).lower() or "database" in str(e).lower():
+        if is_db_error(e):
             fail(503, "db_unavailable", "Database connection failed")
         else:
             fail(500, "internal", "Internal server error", detail=str(e))
 
-@app.post("/bots/{bot_id}/reload")
+@app.post("/bots/{bot_id}/reload", response_model=ReloadResponse)
 async def reload_bot(bot_id: str):
     """Invalidate cache for bot"""
     # Clear simple cache
     if bot_id in bot_cache:
         del bot_cache[bot_id]
 
+    # Next message in this worker reloads the spec from the database (others within BOT_CONFIG_TTL)
+    dsl.invalidate_spec(bot_id)
+
     # Clear all versioned router cache entries for this bot
-    keys_to_remove = [key for key in router_cache.keys() if key.startswith(f"{bot_id}:")]
+    prefix = f"{bot_id}:"
+    keys_to_remove = [key for key in router_cache.keys() if key.startswith(prefix)]
     for key in keys_to_remove:
         del router_cache[key]
 
@@ -111,72 +211,45 @@ def metrics():
 async def preview_send(p: PreviewRequest):
     bot_id = str(p.bot_id)
     text = p.text
-    from .dsl_engine import handle
-    from .telemetry import measured_preview
-    from .logging import with_trace
-    from .http_errors import fail
 
     tid = with_trace()
     log.info("preview", bot_id=bot_id, trace_id=tid, text=text[:64])  # limit text in logs
 
     try:
-        bot_reply = await measured_preview(bot_id, handle, bot_id, text)
+        bot_reply = await measured_preview(bot_id, dsl.handle, bot_id, text)
         return {"bot_reply": bot_reply}
     except HTTPException:
         raise  # Re-raise HTTP exceptions as-is
     except ValueError as e:
         fail(400, "bad_request", str(e))
     except Exception as e:
-        if "db" in str(e).lower() or "database" in str(e).lower():
-            fail(503, "db_unavailable", "Database connection failed")
-        elif isinstance(e, KeyError):
-            fail(400, "bad_request", "Invalid input data", field=str(e))
-        else:
-            fail(500, "internal", "Internal server error", detail=str(e))
+        fail_unexpected(e)
 
-@app.post("/tg/{bot_id}")
+@app.post("/tg/{bot_id}", response_model=WebhookResponse, response_model_exclude_none=True)
 async def tg_webhook(bot_id: str, update: dict):
-    from .telemetry import measured_webhook
-    from .logging import with_trace
-    from .http_errors import fail
-
     async def process_update(bot_id: str, update: dict):
         """Process Telegram update"""
-        from aiogram import Bot, Dispatcher
-        from aiogram.types import Update
-        from .dsl_engine import build_router
-
-        # Load bot spec and build router
-        async with async_session() as session:
-            bot_config = await loader.load_spec_by_bot_id(session, bot_id)
-            if not bot_config:
-                return {"ok": False, "error": "Bot not found"}
-
-            # Get bot token from database
-            from sqlalchemy import text
-            bot_token_query = await session.execute(
-                text("SELECT token FROM bots WHERE id = :bot_id"),
-                {"bot_id": bot_id}
-            )
-            bot_token_result = bot_token_query.fetchone()
-            if not bot_token_result:
-                return {"ok": False, "error": "Bot token not found"}
-
-            bot_token = bot_token_result[0]
+        # Same cached config as preview; a burst of updates for one bot shares one DB load
+        bot_config = await dsl.load_bot_config(bot_id)
+        if not bot_config:
+            return {"ok": False, "error": "Bot not found"}
 
-            # Create aiogram instances
-            bot = Bot(token=bot_token)
-            dp = Dispatcher()
+        # Token comes with the spec (loader joins bots), no second query
+        bot_token = bot_config.get("token")
+        if not bot_token:
+            return {"ok": False, "error": "Bot token not found"}
 
-            # Build and include router from spec
-            router = build_router(bot_config["spec_json"])
-            dp.include_router(router)
+        # Reuse the bot for this token and the dispatcher built for this spec version
+        bot = get_bot(bot_token)
+        dp = get_dispatcher(bot_config)
 
-            # Process the update
-            aiogram_update = Update.model_validate(update)
-            await dp.feed_update(bot, aiogram_update)
+        # Validate now, run handlers after responding so Telegram is not kept waiting
+        aiogram_update = Update.model_validate(update)
+        if schedule_update(bot_id, dp, bot, aiogram_update) is None:
+            log.warning("webhook_update_rejected", bot_id=bot_id, in_flight=len(_update_tasks))
+            fail(503, "overloaded", "Too many updates in flight, retry later")
 
-            return {"ok": True}
+        return {"ok": True}
 
     # Add metrics and logging
     tid = with_trace()
@@ -191,9 +264,4 @@ async def tg_webhook(bot_id: str, update: dict):
     except HTTPException:
         raise  # Re-raise HTTP exceptions as-is
     except Exception as e:
-        if "db" in str(e).lower() or "database" in str(e).lower():
-            fail(503, "db_unavailable", "Database connection failed")
-        elif isinstance(e, KeyError):
-            fail(400, "bad_request", "Invalid input data", field=str(e))
-        else:
-            fail(500, "internal", "Internal server error", detail=str(e))
\ No newline at end of file
+        fail_unexpected(e)
\ No newline at end of file
@@ -1,6 +1,6 @@
 """Pydantic schemas for request validation"""
 from pydantic import BaseModel, ConfigDict, UUID4, field_validator
-from typing import Union
+from typing import Optional, Union
 import uuid
 
 class PreviewRequest(BaseModel):
@@ -33,7 +33,13 @@ class HealthDBResponse(BaseModel):
 
     db_ok: bool
 
+class WebhookResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    ok: bool
+    error: Optional[str] = None
+
 class BotReplyResponse(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
-    bot_reply: str
\ No newline at end of file
+    bot_reply: str
@@ -1,19 +1,41 @@
 from prometheus_client import Counter, Histogram, generate_latest
-from time import perf_counter
+from time import perf_counter_ns
 from fastapi import HTTPException
 
 # Prometheus metrics
 updates = Counter("bot_updates_total", "Total bot updates", ["bot_id"])
 lat = Histogram("dsl_handle_latency_ms", "DSL handle latency in milliseconds", buckets=(0.01,0.05,0.1,0.2,0.5,1,2,5))
 webhook_lat = Histogram("webhook_latency_ms", "Webhook latency in milliseconds", buckets=(0.01,0.05,0.1,0.2,0.5,1,2))
+# Webhook handlers run after the 200 is sent, so webhook_latency_ms does not include them
+webhook_handle_lat = Histogram("webhook_handle_latency_ms", "Background webhook update handling latency in milliseconds", buckets=(1,5,10,25,50,100,250,500,1000,2500,5000))
 errors = Counter("bot_errors_total", "Total bot errors", ["bot_id", "where", "code"])
 
+# .labels() hashes and locks on every call; resolve each bot's child once
+_updates_children = {}
+
+def updates_for(bot_id):
+    """Labelled bot_updates_total child for bot_id"""
+    child = _updates_children.get(bot_id)
+    if child is None:
+        child = _updates_children[bot_id] = updates.labels(bot_id)
+    return child
+
+_errors_children = {}
+
+def errors_for(bot_id, where, code):
+    """Labelled bot_errors_total child for (bot_id, where, code)"""
+    key = (bot_id, where, code)
+    child = _errors_children.get(key)
+    if child is None:
+        child = _errors_children[key] = errors.labels(bot_id, where, code)
+    return child
+
 async def measure(bot_id, fn, *a, **kw):
     """Measure function execution time and record metrics"""
-    t = perf_counter()
+    t = perf_counter_ns()
     res = await fn(*a, **kw)
-    updates.labels(bot_id).inc()
-    lat.observe((perf_counter() - t) * 1000)
+    updates_for(bot_id).inc()
+    lat.observe((perf_counter_ns() - t) / 1_000_000)
     return res
 
 async def measured_preview(bot_id, fn, *a, **kw):
@@ -21,24 +43,24 @@ async def measured_preview(bot_id, fn, *a, **kw):
     try:
         return await measure(bot_id, fn, *a, **kw)
     except HTTPException as e:
-        errors.labels(bot_id, "preview", str(e.status_code)).inc()
+        errors_for(bot_id, "preview", str(e.status_code)).inc()
         raise
     except Exception as e:
-        errors.labels(bot_id, "preview", "500").inc()
+        errors_for(bot_id, "preview", "500").inc()
         raise
 
 async def measured_webhook(bot_id, fn, *a, **kw):
     """Measure with error tracking and latency for webhook"""
-    t = perf_counter()
+    t = perf_counter_ns()
     try:
         result = await fn(*a, **kw)
-        updates.labels(bot_id).inc()
+        updates_for(bot_id).inc()
         return result
     except HTTPException as e:
-        errors.labels(bot_id, "webhook", str(e.status_code)).inc()
+        errors_for(bot_id, "webhook", str(e.status_code)).inc()
         raise
     except Exception as e:
-        errors.labels(bot_id, "webhook", "500").inc()
+        errors_for(bot_id, "webhook", "500").inc()
         raise
     finally:
-        webhook_lat.observe((perf_counter() - t) * 1000)
\ No newline at end of file
+        webhook_lat.observe((perf_counter_ns() - t) / 1_000_000)
\ No newline at end of file
@@ -91,6 +91,13 @@ cat > "$JSON_FILE" << EOF
 }
 EOF
 
+# Warm up: the first request for a bot loads its spec and builds its router,
+# keep that cold-start cost out of the measured latencies
+curl -s --max-time "$TIMEOUT" -X POST \
+    -H "Content-Type: application/json" \
+    -d @"$JSON_FILE" \
+    "$ENDPOINT" > /dev/null || true
+
 echo ""
 echo "📊 Starting performance test..."
 echo "Temporary files: $TEMP_DIR"
@@ -148,25 +155,17 @@ run_with_curl() {
     echo "Total time: ${total_time}s"
 
     if [[ $success_count -gt 0 ]]; then
-        # Extract timing data
-        grep "HTTPSTATUS:200" "$RESULTS_FILE" | \
-        sed 's/.*TIME_TOTAL:\([^;]*\).*/\1/' | \
-        sort -n > "$TEMP_DIR/times.txt"
-
-        # Calculate statistics
-        times_count=$(wc -l < "$TEMP_DIR/times.txt")
-        avg_time=$(awk '{sum+=$1} END {print sum/NR}' "$TEMP_DIR/times.txt")
-        min_time=$(head -1 "$TEMP_DIR/times.txt")
-        max_time=$(tail -1 "$TEMP_DIR/times.txt")
-
-        # Calculate percentiles
-        p50_line=$((times_count * 50 / 100))
-        p95_line=$((times_count * 95 / 100))
-        p99_line=$((times_count * 99 / 100))
-
-        p50_time=$(sed -n "${p50_line}p" "$TEMP_DIR/times.txt")
-        p95_time=$(sed -n "${p95_line}p" "$TEMP_DIR/times.txt")
-        p99_time=$(sed -n "${p99_line}p" "$TEMP_DIR/times.txt")
+        # Min/avg/max and nearest-rank percentiles in one awk pass over the sorted times
+        read -r min_time avg_time max_time p50_time p95_time p99_time < <(
+            grep "HTTPSTATUS:200" "$RESULTS_FILE" | \
+            sed 's/.*TIME_TOTAL:\([^;]*\).*/\1/' | \
+            sort -n | \
+            awk '
+                function pct(p,  i) { i = int((NR * p + 99) / 100); return t[i < 1 ? 1 : i] }
+                { t[NR] = $1; sum += $1 }
+                END { print t[1], sum / NR, t[NR], pct(50), pct(95), pct(99) }
+            '
+        )
 
         echo ""
         echo "⏱️  Response Times:"
@@ -10,24 +10,25 @@ import httpx
 import os
 
 
-async def get_updates(token: str, offset: int = 0):
+POLL_TIMEOUT = 10  # seconds Telegram holds getUpdates open
+
+
+async def get_updates(client: httpx.AsyncClient, token: str, offset: int = 0):
     """Get updates from Telegram API"""
     url = f"https://api.telegram.org/bot{token}/getUpdates"
-    params = {"offset": offset, "timeout": 10}
+    params = {"offset": offset, "timeout": POLL_TIMEOUT}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-        return response.json()
+    response = await client.get(url, params=params)
+    return response.json()
 
 
-async def send_to_runtime(bot_id: str, update: dict):
+async def send_to_runtime(client: httpx.AsyncClient, bot_id: str, update: dict):
     """Send update to botfactory runtime"""
     runtime_url = os.getenv("RUNTIME_URL", "http://localhost:8000")
     url = f"{runtime_url}/tg/{bot_id}"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=update)
-        return response.json()
+    response = await client.post(url, json=update)
+    return response.json()
 
 
 async def polling_loop(token: str, bot_id: str):
@@ -35,32 +36,38 @@ async def polling_loop(token: str, bot_id: str):
     offset = 0
     print(f"Starting polling for bot {bot_id}")
 
-    while True:
-        try:
-            result = await get_updates(token, offset)
+    # One pooled client for the whole loop: keep-alive connections to Telegram and the runtime.
+    # Read timeout must outlast the long poll, otherwise every idle getUpdates times out.
+    limits = httpx.Limits(max_connections=8, max_keepalive_connections=8)
+    timeout = httpx.Timeout(10.0, read=POLL_TIMEOUT + 10)
 
-            if not result.get("ok"):
-                print(f"Error from Telegram: {result}")
-                await asyncio.sleep(5)
-                continue
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        while True:
+            try:
+                result = await get_updates(client, token, offset)
 
-            updates = result.get("result", [])
+                if not result.get("ok"):
+                    print(f"Error from Telegram: {result}")
+                    await asyncio.sleep(5)
+                    continue
 
-            for update in updates:
-                update_id = update.get("update_id")
-                print(f"Processing update {update_id}")
+                updates = result.get("result", [])
 
-                try:
-                    response = await send_to_runtime(bot_id, update)
-                    print(f"Runtime response: {response}")
-                except Exception as e:
-                    print(f"Error sending to runtime: {e}")
+                for update in updates:
+                    update_id = update.get("update_id")
+                    print(f"Processing update {update_id}")
 
-                offset = max(offset, update_id + 1)
+                    try:
+                        response = await send_to_runtime(client, bot_id, update)
+                        print(f"Runtime response: {response}")
+                    except Exception as e:
+                        print(f"Error sending to runtime: {e}")
 
-        except Exception as e:
-            print(f"Polling error: {e}")
-            await asyncio.sleep(5)
+                    offset = max(offset, update_id + 1)
+
+            except Exception as e:
+                print(f"Polling error: {e}")
+                await asyncio.sleep(5)
 
 
 def main():
@@ -1,8 +1,12 @@
+import importlib.util
 import os
 import pytest
 from fastapi.testclient import TestClient
-from httpx import AsyncClient
-from runtime.main import app
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from runtime import dsl_engine
+from runtime.main import app, DATABASE_URL
 
 # Global anyio marker for all tests
 pytestmark = pytest.mark.anyio
@@ -11,29 +15,76 @@ pytestmark = pytest.mark.anyio
 if os.environ.get("INSIDE_CONTAINER") != "1":
     pytest.skip("run inside docker", allow_module_level=True)
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def client():
-    """FastAPI TestClient fixture"""
-    return TestClient(app)
+    """FastAPI TestClient shared by the whole session (one portal and pool)"""
+    with TestClient(app) as c:
+        yield c
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 async def async_client():
-    """Async HTTP client fixture"""
-    async with AsyncClient(app=app, base_url="http://test") as ac:
+    """Async HTTP client shared by the whole session (in-process ASGI transport)"""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         yield ac
 
-@pytest.fixture(scope="function")
-def anyio_backend():
-    return "asyncio"
+# Unpooled engine: test event loops are short-lived, pooled connections would outlive them
+test_engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+
+@pytest.fixture
+async def db_session():
+    """AsyncSession wrapped in a transaction that is rolled back after the test.
+
+    session.commit() only releases a SAVEPOINT, so writes made through the
+    registry never leak into the seeded database or into other tests.
+    """
+    async with test_engine.connect() as conn:
+        trans = await conn.begin()
+        session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        try:
+            yield session
+        finally:
+            await session.close()
+            await trans.rollback()
 
 @pytest.fixture
+def stage_spec(monkeypatch):
+    """Serve a fixed spec from dsl_engine.load_spec; _stage returns the bot_ids it was asked for"""
+    def _stage(spec):
+        loaded = []
+
+        async def fake_load_spec(bot_id):
+            loaded.append(bot_id)
+            return spec
+
+        monkeypatch.setattr(dsl_engine, "load_spec", fake_load_spec)
+        return loaded
+    return _stage
+
+# Session scope so session-scoped async fixtures can share one event loop;
+# uvloop (shipped with uvicorn[standard]) matches the loop the service runs on
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return ("asyncio", {"use_uvloop": importlib.util.find_spec("uvloop") is not None})
+
+@pytest.fixture(scope="session")
 def demo_bot_id():
     """Known bot ID from seed data"""
     return "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def demo_spec():
+    """In-memory copy of the seeded demo bot spec (shared, tests must not mutate it)"""
+    return {
+        "intents": [
+            {"cmd": "/start", "reply": "Привет! Это тестовый бот."},
+            {"cmd": "/help", "reply": "Доступные команды: /start, /help"}
+        ],
+        "flows": []
+    }
+
+@pytest.fixture(scope="session")
 def tg_update():
-    """Minimal valid Telegram update"""
+    """Minimal valid Telegram update (shared, tests must not mutate it)"""
     return {
         "update_id": 123,
         "message": {
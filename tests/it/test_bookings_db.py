@@ -0,0 +1,38 @@
+"""Test booking seed helper against the database (each test is rolled back)"""
+import pytest
+from sqlalchemy import text
+from tests.utils import seed_bookings
+
+BOT_ID = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
+
+@pytest.fixture
+def bookings_factory(db_session):
+    """Seed bookings for a user inside the test transaction"""
+    async def factory(user_id, n):
+        await seed_bookings(db_session, BOT_ID, user_id, n)
+    return factory
+
+@pytest.mark.anyio
+async def test_seed_bookings_inserts_all_rows(db_session, bookings_factory):
+    """Test that one bulk insert creates every requested booking"""
+    await bookings_factory(user_id=42, n=7)
+
+    result = await db_session.execute(
+        text("SELECT count(*) FROM bookings WHERE bot_id = :bot_id AND user_id = 42"),
+        {"bot_id": BOT_ID}
+    )
+    assert result.scalar() == 7
+
+@pytest.mark.anyio
+async def test_seed_bookings_ordered_by_created_at(db_session, bookings_factory):
+    """Test that seeded bookings have distinct, increasing created_at"""
+    await bookings_factory(user_id=43, n=6)
+
+    result = await db_session.execute(
+        text("SELECT slot FROM bookings WHERE bot_id = :bot_id AND user_id = 43 "
+             "ORDER BY created_at DESC LIMIT 5"),
+        {"bot_id": BOT_ID}
+    )
+    slots = [row.slot for row in result]
+    assert len(slots) == 5
+    assert slots == sorted(slots, reverse=True)
@@ -1,11 +1,17 @@
 """Test cache functionality and TTL behavior"""
+import asyncio
+import os
 import pytest
+import sys
 import time
+import tracemalloc
 from unittest.mock import patch, AsyncMock
-from fastapi.testclient import TestClient
-from runtime.main import app, bot_cache, router_cache
+from runtime.main import bot_cache, router_cache
+
+# Timing budgets depend on the host, so they are opt-in (make testp sets PERF_STRICT=1);
+# they stay off under coverage or a debugger even then
+PERF_STRICT = os.getenv("PERF_STRICT", "0") == "1" and sys.gettrace() is None
 
-client = TestClient(app)
 
 def test_bot_cache_basic_operations():
     """Test basic bot cache operations"""
@@ -98,7 +104,7 @@ def test_router_cache_ttl_expiration():
     # Item should be expired and removed
     assert test_bot_id not in short_ttl_cache
 
-def test_cache_invalidation_via_reload():
+def test_cache_invalidation_via_reload(client):
     """Test cache invalidation through reload endpoint"""
     bot_id = "reload-invalidation-test"
 
@@ -193,31 +199,33 @@ def test_multiple_bot_cache_isolation():
     assert bot_id_2 in bot_cache
     assert bot_cache[bot_id_2] == data_2
 
-def test_cache_concurrent_access():
+@pytest.mark.anyio
+async def test_cache_concurrent_access():
     """Test cache under concurrent access"""
-    import threading
-    import concurrent.futures
-
+    # The runtime touches its caches from event-loop tasks, so interleave tasks, not threads
     bot_cache.clear()
     test_bot_id = "concurrent-cache-test"
 
     results = []
     errors = []
 
-    def cache_worker(worker_id):
+    async def cache_worker(worker_id):
         try:
             # Add to cache
             worker_data = {"worker": worker_id, "data": f"data-{worker_id}"}
             bot_cache[f"{test_bot_id}-{worker_id}"] = worker_data
+            await asyncio.sleep(0)
 
             # Read from cache
             if f"{test_bot_id}-{worker_id}" in bot_cache:
                 results.append(("read", worker_id, True))
             else:
                 results.append(("read", worker_id, False))
+            await asyncio.sleep(0)
 
             # Update cache
             bot_cache[f"{test_bot_id}-{worker_id}"] = {"updated": True}
+            await asyncio.sleep(0)
 
             # Final read
             final_data = bot_cache.get(f"{test_bot_id}-{worker_id}")
@@ -227,9 +235,7 @@ def test_cache_concurrent_access():
             errors.append((worker_id, str(e)))
 
     # Run multiple workers concurrently
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(cache_worker, i) for i in range(5)]
-        concurrent.futures.wait(futures)
+    await asyncio.gather(*[cache_worker(i) for i in range(5)])
 
     # Verify no errors occurred
     assert len(errors) == 0, f"Errors occurred: {errors}"
@@ -242,21 +248,38 @@ def test_cache_memory_usage():
     bot_cache.clear()
 
     # Current implementation uses simple dict, so no automatic limit
-    # But we can test that manual clearing works
+    # But we can test that manual clearing works and frees what it held
+    # Leave tracing alone if someone else (e.g. python -X tracemalloc) already runs it
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
 
-    # Add many items
-    for i in range(1000):
-        bot_cache[f"memory-test-bot-{i}"] = f"data-{i}"
+        # Add many items
+        for i in range(1000):
+            bot_cache[f"memory-test-bot-{i}"] = f"data-{i}"
 
-    initial_size = len(bot_cache)
-    assert initial_size == 1000
+        initial_size = len(bot_cache)
+        assert initial_size == 1000
 
-    # Clear cache
-    bot_cache.clear()
+        # Clear cache
+        bot_cache.clear()
+
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
 
     # Should be empty
     assert len(bot_cache) == 0
 
+    # Allocations made from this file must be gone once the cache is cleared
+    here = [tracemalloc.Filter(True, __file__)]
+    stats = after.filter_traces(here).compare_to(before.filter_traces(here), "filename")
+    growth = sum(stat.size_diff for stat in stats)
+    assert growth < 64 * 1024, f"{growth} bytes still held after clear"
+
 def test_router_cache_different_bots():
     """Test router cache with different bots"""
     router_cache.clear()
@@ -273,16 +296,6 @@ def test_router_cache_different_bots():
         assert bot_id in router_cache
         assert router_cache[bot_id] == router
 
-    # Test LRU behavior - access first bot
-    _ = router_cache[bot_ids[0]]
-
-    # Add more items to trigger eviction
-    for i in range(router_cache.maxsize):
-        router_cache[f"eviction-test-{i}"] = f"eviction-router-{i}"
-
-    # First bot should still be cached (recently accessed)
-    # Last bots from original set might be evicted
-
 def test_cache_with_special_characters():
     """Test cache with special characters in keys"""
     bot_cache.clear()
@@ -305,16 +318,19 @@ def test_cache_with_special_characters():
         assert key in bot_cache
         assert bot_cache[key] == f"data-for-{key}"
 
-def test_cache_performance_characteristics():
+def test_cache_performance_characteristics(request):
     """Test cache performance under load"""
     bot_cache.clear()
 
-    start_time = time.time()
+    num_ops = 1000
+    # Build keys and values up front so only cache operations are timed
+    bot_ids = [f"perf-test-bot-{i % 100}" for i in range(num_ops)]  # Reuse keys to test updates
+    values = [f"data-{i}" for i in range(num_ops)]
+    start_ns = time.perf_counter_ns()
 
     # Perform many cache operations
-    for i in range(1000):
-        bot_id = f"perf-test-bot-{i % 100}"  # Reuse keys to test updates
-        bot_cache[bot_id] = f"data-{i}"
+    for i, (bot_id, value) in enumerate(zip(bot_ids, values)):
+        bot_cache[bot_id] = value
 
         # Occasional reads
         if i % 10 == 0:
@@ -324,11 +340,12 @@ def test_cache_performance_characteristics():
         if i % 50 == 0 and bot_id in bot_cache:
             del bot_cache[bot_id]
 
-    end_time = time.time()
-    duration = end_time - start_time
+    ns_per_op = (time.perf_counter_ns() - start_ns) / num_ops
+    request.node.add_report_section("call", "perf", f"{ns_per_op / 1000:.2f} us/op")
 
-    # Operations should complete quickly (less than 1 second for 1000 operations)
-    assert duration < 1.0, f"Cache operations took too long: {duration}s"
+    # Each operation should stay within a 1 ms budget
+    if PERF_STRICT:
+        assert ns_per_op < 1_000_000, f"Cache operations took too long: {ns_per_op:.0f} ns/op"
 
 def test_cache_data_integrity():
     """Test that cached data maintains integrity"""
@@ -369,7 +386,7 @@ def test_cache_data_integrity():
     # Note: Python dicts are mutable, so this test depends on implementation
     # In a production system, you might want to use copy.deepcopy
 
-def test_reload_multiple_bots():
+def test_reload_multiple_bots(client):
     """Test reloading multiple bots affects only targeted bot"""
     bot_cache.clear()
 
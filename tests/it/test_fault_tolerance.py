@@ -1,26 +1,28 @@
 """Test fault tolerance and error handling"""
 import pytest
 from unittest.mock import patch, AsyncMock
-from fastapi.testclient import TestClient
 from http import HTTPStatus
-from runtime.main import app
+from runtime import main
+from tests.utils import bot_reply, send_texts
 
-client = TestClient(app)
 
-def test_health_db_when_database_down():
+class DownRegistry:
+    """Registry stand-in whose database check always fails"""
+    async def db_ok(self, sess):
+        return False
+
+def test_health_db_when_database_down(monkeypatch, client):
     """Test /health/db endpoint when database is unavailable"""
-    with patch('runtime.main.registry') as mock_registry:
-        # Mock database failure - db_ok is async function
-        mock_registry.db_ok = AsyncMock(return_value=False)
+    monkeypatch.setattr(main, "registry", DownRegistry())
 
-        response = client.get("/health/db")
+    response = client.get("/health/db")
 
-        assert response.status_code == 503  # Should return 503 for DB down
-        data = response.json()
-        assert "db_ok" in data
-        assert data["db_ok"] is False
+    assert response.status_code == 503  # Should return 503 for DB down
+    data = response.json()
+    assert "db_ok" in data
+    assert data["db_ok"] is False
 
-def test_preview_validation_422():
+def test_preview_validation_422(client):
     """Test preview endpoint validation returns 422 for missing fields"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -35,7 +37,7 @@ def test_preview_validation_422():
     data = response.json()
     assert "detail" in data
 
-def test_preview_validation_empty_text():
+def test_preview_validation_empty_text(client):
     """Test preview endpoint with empty text"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -47,7 +49,7 @@ def test_preview_validation_empty_text():
     # Pydantic should handle empty text validation
     assert response.status_code in [200, 422]
 
-def test_get_bot_spec_not_found():
+def test_get_bot_spec_not_found(client):
     """Test /bots/{bot_id} endpoint with non-existent bot"""
     non_existent_bot_id = "00000000-0000-0000-0000-000000000000"
 
@@ -60,28 +62,25 @@ def test_get_bot_spec_not_found():
     detail_text = str(data.get("detail", data.get("error", "")))
     assert "not found" in detail_text.lower()
 
-def test_preview_with_invalid_bot_spec():
+def test_preview_with_invalid_bot_spec(stage_spec, client):
     """Test preview with bot that has invalid spec_json"""
-    # This test assumes we can mock a bot with invalid spec
     # Current implementation should handle gracefully
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
-    with patch('runtime.dsl_engine.load_spec') as mock_load_spec:
-        # Mock invalid spec that causes processing error
-        mock_load_spec.return_value = {"invalid": "spec_format"}
+    stage_spec({"invalid": "spec_format"})
 
-        response = client.post(
-            "/preview/send",
-            json={"bot_id": bot_id, "text": "/start"}
-        )
+    response = client.post(
+        "/preview/send",
+        json={"bot_id": bot_id, "text": "/start"}
+    )
 
-        # Should handle gracefully
-        assert response.status_code == 200
-        # Should return fallback response
-        data = response.json()
-        assert "bot_reply" in data
+    # Should handle gracefully
+    assert response.status_code == 200
+    # Should return fallback response
+    data = response.json()
+    assert "bot_reply" in data
 
-def test_malformed_json_requests():
+def test_malformed_json_requests(client):
     """Test handling of malformed JSON requests"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -95,7 +94,7 @@ def test_malformed_json_requests():
     # Should return 422 for validation errors
     assert response.status_code == 422
 
-def test_metrics_endpoint_always_available():
+def test_metrics_endpoint_always_available(client):
     """Test that metrics endpoint is always available even under stress"""
     # Metrics should be available even if other parts fail
     response = client.get("/metrics")
@@ -103,7 +102,7 @@ def test_metrics_endpoint_always_available():
     assert response.status_code == 200
     assert response.headers["content-type"] == "text/plain; charset=utf-8"
 
-def test_health_endpoint_always_available():
+def test_health_endpoint_always_available(client):
     """Test that health endpoint is always available"""
     # Basic health check should always work
     response = client.get("/health")
@@ -112,7 +111,7 @@ def test_health_endpoint_always_available():
     data = response.json()
     assert data["ok"] is True
 
-def test_invalid_bot_id_formats():
+def test_invalid_bot_id_formats(client):
     """Test preview with various invalid bot ID formats"""
     invalid_bot_ids = [
         "not-a-uuid",
@@ -129,7 +128,7 @@ def test_invalid_bot_id_formats():
         # Should handle various formats gracefully
         assert response.status_code in [200, 404, 422, 500]
 
-def test_reload_with_various_bot_ids():
+def test_reload_with_various_bot_ids(client):
     """Test reload endpoint accepts any string as bot_id"""
     test_bot_ids = [
         "c3b88b65-623c-41b5-a3c9-8d56fcbc4413",
@@ -146,7 +145,7 @@ def test_reload_with_various_bot_ids():
         assert data["bot_id"] == bot_id
         assert data["cache_invalidated"] is True
 
-def test_preview_with_malformed_json():
+def test_preview_with_malformed_json(client):
     """Test preview endpoint with various malformed JSON"""
     malformed_payloads = [
         '{"bot_id": "test", "text": "/start"',  # Missing closing brace
@@ -167,7 +166,7 @@ def test_preview_with_malformed_json():
         # Should return 422 for validation errors
         assert response.status_code == 422
 
-def test_webhook_with_malformed_telegram_update():
+def test_webhook_with_malformed_telegram_update(client):
     """Test webhook endpoint with malformed Telegram updates"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -232,7 +231,7 @@ def test_concurrent_cache_operations():
     error_results = [r for r in results if r[0] == "error"]
     assert len(error_results) == 0
 
-def test_large_payload_handling():
+def test_large_payload_handling(client):
     """Test handling of very large payloads"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -247,23 +246,20 @@ def test_large_payload_handling():
     # Should handle large payloads gracefully
     assert response.status_code in [200, 413, 422]
 
-def test_rapid_successive_requests():
+@pytest.mark.anyio
+async def test_rapid_successive_requests(async_client):
     """Test rapid successive requests to same bot"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
-    responses = []
-    for i in range(10):
-        response = client.post(
-            "/preview/send",
-            json={"bot_id": bot_id, "text": f"/test_{i}"}
-        )
-        responses.append(response)
+    responses = await send_texts(async_client, bot_id, [f"/test_{i}" for i in range(10)])
 
     # All requests should succeed
+    assert len(responses) == 10
     for response in responses:
-        assert response.status_code == 200
+        bot_reply(response)
 
-def test_preview_with_unicode_and_special_chars():
+@pytest.mark.anyio
+async def test_preview_with_unicode_and_special_chars(async_client):
     """Test preview with various Unicode and special characters"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -279,19 +275,15 @@ def test_preview_with_unicode_and_special_chars():
         "NULL\x00char"
     ]
 
-    for text in special_texts:
-        response = client.post(
-            "/preview/send",
-            json={"bot_id": bot_id, "text": text}
-        )
+    responses = await send_texts(async_client, bot_id, special_texts)
 
-        # Should handle all special characters
-        assert response.status_code == 200
-        data = response.json()
-        assert "bot_reply" in data
+    # Should handle all special characters
+    assert len(responses) == len(special_texts)
+    for response in responses:
+        bot_reply(response)
 
-@patch('runtime.main.engine')
-def test_database_connection_recovery(mock_engine):
+@patch.object(main, "engine")
+def test_database_connection_recovery(mock_engine, client):
     """Test database connection recovery scenarios"""
     # This test simulates database reconnection
     # First call fails, second succeeds
@@ -3,20 +3,30 @@ import pytest
 import json
 import re
 from unittest.mock import patch, MagicMock
-from fastapi.testclient import TestClient
-from runtime.main import app
+from runtime import logging_setup
 from runtime.logging import with_trace
+from tests.utils import JSON_HEADERS, START_BODY, send_texts
 
-client = TestClient(app)
+UUID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
 
 # Mock logging for tests to avoid log output
 @pytest.fixture(autouse=True)
 def mock_logging(monkeypatch):
     """Mock logging functions to avoid output during tests"""
-    monkeypatch.setattr("runtime.logging_setup.log.info", lambda *a, **k: None)
-    monkeypatch.setattr("runtime.logging_setup.log.error", lambda *a, **k: None)
-    monkeypatch.setattr("runtime.logging_setup.log.warning", lambda *a, **k: None)
-    monkeypatch.setattr("runtime.logging_setup.log.debug", lambda *a, **k: None)
+    for level in ("info", "error", "warning", "debug"):
+        monkeypatch.setattr(logging_setup.log, level, lambda *a, **k: None)
+
+@pytest.fixture(autouse=True)
+def in_memory_spec(stage_spec, demo_spec):
+    """Serve the demo spec so log tests never round-trip to the database"""
+    stage_spec(demo_spec)
+
+@pytest.fixture
+def log_calls(monkeypatch):
+    """Collect log.info calls in an in-memory list"""
+    calls = []
+    monkeypatch.setattr(logging_setup.log, "info", lambda *a, **k: calls.append((a, k)))
+    return calls
 
 def test_trace_id_generation():
     """Test that trace_id is generated correctly"""
@@ -27,8 +37,7 @@ def test_trace_id_generation():
     assert len(trace_id) > 0
 
     # Test UUID format (basic check)
-    uuid_pattern = r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
-    assert re.match(uuid_pattern, trace_id)
+    assert UUID_RE.match(trace_id)
 
 def test_trace_id_with_context():
     """Test trace_id with provided context"""
@@ -37,16 +46,8 @@ def test_trace_id_with_context():
 
     assert trace_id == custom_trace
 
-def test_preview_logs_structure(monkeypatch, demo_bot_id):
+def test_preview_logs_structure(demo_bot_id, log_calls, client):
     """Test that preview endpoint logs contain required fields"""
-    calls = []
-
-    def fake_info(*args, **kwargs):
-        calls.append((args, kwargs))
-
-    from runtime import logging_setup
-    monkeypatch.setattr(logging_setup.log, "info", fake_info)
-
     test_text = "/start"
     response = client.post(
         "/preview/send",
@@ -54,10 +55,10 @@ def test_preview_logs_structure(monkeypatch, demo_bot_id):
     )
 
     assert response.status_code == 200
-    assert len(calls) > 0
+    assert len(log_calls) > 0
 
     # Check the first log call
-    args, kwargs = calls[0]
+    args, kwargs = log_calls[0]
     assert len(args) > 0
     assert args[0] == "preview"
 
@@ -70,16 +71,11 @@ def test_preview_logs_structure(monkeypatch, demo_bot_id):
     assert kwargs["bot_id"] == demo_bot_id
     assert isinstance(kwargs["trace_id"], str)
 
-@patch('runtime.logging_setup.log')
-def test_logs_no_token_exposure(mock_log):
+@patch.object(logging_setup, "log")
+def test_logs_no_token_exposure(mock_log, client):
     """Test that tokens are not logged"""
-    bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
-
-    # Make preview request
-    response = client.post(
-        "/preview/send",
-        json={"bot_id": bot_id, "text": "/start"}
-    )
+    # Make preview request for the demo bot
+    response = client.post("/preview/send", content=START_BODY, headers=JSON_HEADERS)
 
     assert response.status_code == 200
 
@@ -133,27 +129,17 @@ def test_log_format_fields():
     processor_names = [p.__class__.__name__ for p in processors]
     assert "TimeStamper" in processor_names
 
-def test_multiple_preview_calls_different_trace_ids(monkeypatch, demo_bot_id):
+@pytest.mark.anyio
+async def test_multiple_preview_calls_different_trace_ids(demo_bot_id, async_client, log_calls):
     """Test that multiple calls generate different trace IDs"""
-    calls = []
-
-    def fake_info(*args, **kwargs):
-        calls.append((args, kwargs))
-
-    from runtime import logging_setup
-    monkeypatch.setattr(logging_setup.log, "info", fake_info)
-
     # Make multiple requests
-    for i in range(3):
-        response = client.post(
-            "/preview/send",
-            json={"bot_id": demo_bot_id, "text": f"/start_{i}"}
-        )
+    responses = await send_texts(async_client, demo_bot_id, [f"/start_{i}" for i in range(3)])
+    for response in responses:
         assert response.status_code == 200
 
     # Get all trace_ids from log calls
     trace_ids = []
-    for args, kwargs in calls:
+    for args, kwargs in log_calls:
         if "trace_id" in kwargs:
             trace_ids.append(kwargs["trace_id"])
 
@@ -161,16 +147,8 @@ def test_multiple_preview_calls_different_trace_ids(monkeypatch, demo_bot_id):
     assert len(trace_ids) == 3
     assert len(set(trace_ids)) == 3  # All unique
 
-def test_log_special_characters(monkeypatch, demo_bot_id):
+def test_log_special_characters(demo_bot_id, log_calls, client):
     """Test logging with special characters"""
-    calls = []
-
-    def fake_info(*args, **kwargs):
-        calls.append((args, kwargs))
-
-    from runtime import logging_setup
-    monkeypatch.setattr(logging_setup.log, "info", fake_info)
-
     special_text = "Привет! 🤖 /start"
     response = client.post(
         "/preview/send",
@@ -178,22 +156,14 @@ def test_log_special_characters(monkeypatch, demo_bot_id):
     )
 
     assert response.status_code == 200
-    assert len(calls) > 0
+    assert len(log_calls) > 0
 
     # Check logged text contains special characters
-    args, kwargs = calls[0]
+    args, kwargs = log_calls[0]
     assert special_text[:10] in str(kwargs.get("text", ""))  # First 10 chars
 
-def test_log_long_text(monkeypatch, demo_bot_id):
+def test_log_long_text(demo_bot_id, log_calls, client):
     """Test logging with very long text"""
-    calls = []
-
-    def fake_info(*args, **kwargs):
-        calls.append((args, kwargs))
-
-    from runtime import logging_setup
-    monkeypatch.setattr(logging_setup.log, "info", fake_info)
-
     long_text = "A" * 1000
     response = client.post(
         "/preview/send",
@@ -201,10 +171,10 @@ def test_log_long_text(monkeypatch, demo_bot_id):
     )
 
     assert response.status_code == 200
-    assert len(calls) > 0
+    assert len(log_calls) > 0
 
     # Check logged text (might be truncated)
-    args, kwargs = calls[0]
+    args, kwargs = log_calls[0]
     logged_text = kwargs.get("text", "")
     assert "A" in str(logged_text)  # Contains part of long text
 
@@ -251,32 +221,18 @@ def test_log_level_configuration():
         # The filtering bound logger should be configured for INFO level
         assert callable(wrapper_class)
 
-def test_concurrent_logging(monkeypatch, demo_bot_id):
+@pytest.mark.anyio
+async def test_concurrent_logging(demo_bot_id, log_calls, async_client):
     """Test logging under concurrent requests"""
-    calls = []
-
-    def fake_info(*args, **kwargs):
-        calls.append((args, kwargs))
-
-    from runtime import logging_setup
-    monkeypatch.setattr(logging_setup.log, "info", fake_info)
-
-    # Make multiple concurrent-like requests
-    responses = []
-    for i in range(5):
-        response = client.post(
-            "/preview/send",
-            json={"bot_id": demo_bot_id, "text": f"/concurrent_{i}"}
-        )
-        responses.append(response)
+    responses = await send_texts(async_client, demo_bot_id, [f"/concurrent_{i}" for i in range(5)])
 
     # All should succeed
     for response in responses:
         assert response.status_code == 200
 
     # Should have at least 5 log entries
-    assert len(calls) >= 5
+    assert len(log_calls) >= 5
 
     # Each should have unique trace_id
-    trace_ids = [kwargs.get("trace_id") for args, kwargs in calls if "trace_id" in kwargs]
+    trace_ids = [kwargs.get("trace_id") for args, kwargs in log_calls if "trace_id" in kwargs]
     assert len(set(trace_ids)) >= 5
\ No newline at end of file
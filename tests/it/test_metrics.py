@@ -1,19 +1,18 @@
 """Test metrics endpoint and tracking"""
 import pytest
-import re
-from fastapi.testclient import TestClient
-from runtime.main import app
+from prometheus_client import generate_latest
+from runtime import dsl_engine
+from runtime.telemetry import updates_for, errors_for
+from tests.utils import JSON_HEADERS, START_BODY, counter_value, send_texts
 
-client = TestClient(app)
-
-def test_metrics_endpoint_exists():
+def test_metrics_endpoint_exists(client):
     """Test that metrics endpoint is accessible"""
     response = client.get("/metrics")
 
     assert response.status_code == 200
     assert response.headers["content-type"] == "text/plain; charset=utf-8"
 
-def test_metrics_prometheus_format():
+def test_metrics_prometheus_format(client):
     """Test that metrics are in Prometheus format"""
     response = client.get("/metrics")
 
@@ -23,7 +22,7 @@ def test_metrics_prometheus_format():
     # Check for Prometheus format indicators
     assert "# HELP" in content or "# TYPE" in content or "_total" in content
 
-def test_metrics_bot_updates_counter():
+def test_metrics_bot_updates_counter(client):
     """Test that bot_updates_total metric is present"""
     response = client.get("/metrics")
 
@@ -33,7 +32,7 @@ def test_metrics_bot_updates_counter():
     # Look for bot_updates_total metric
     assert "bot_updates_total" in content
 
-def test_metrics_latency_histogram():
+def test_metrics_latency_histogram(client):
     """Test that dsl_handle_latency_ms metric is present"""
     response = client.get("/metrics")
 
@@ -43,48 +42,32 @@ def test_metrics_latency_histogram():
     # Look for latency histogram metric
     assert "dsl_handle_latency_ms" in content
 
-def test_metrics_after_preview_calls():
+@pytest.mark.anyio
+async def test_metrics_after_preview_calls(async_client):
     """Test that metrics increment after preview calls"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
-    # Get initial metrics
-    initial_response = client.get("/metrics")
-    initial_content = initial_response.text
-
-    # Extract initial counter value if present
-    pattern = rf'bot_updates_total{{bot_id="{bot_id}"}} (\d+)'
-    initial_match = re.search(pattern, initial_content)
-    initial_count = int(initial_match.group(1)) if initial_match else 0
+    # Get initial counter value (0 if not yet present)
+    initial_response = await async_client.get("/metrics")
+    initial_count = counter_value(initial_response.text, "bot_updates_total", bot_id=bot_id)
 
     # Make several preview calls
     num_calls = 3
-    for i in range(num_calls):
-        preview_response = client.post(
-            "/preview/send",
-            json={"bot_id": bot_id, "text": f"/start_{i}"}
-        )
+    responses = await send_texts(async_client, bot_id, [f"/start_{i}" for i in range(num_calls)])
+    for preview_response in responses:
         assert preview_response.status_code == 200
 
-    # Get updated metrics
-    updated_response = client.get("/metrics")
-    updated_content = updated_response.text
-
     # Check that counter increased
-    updated_match = re.search(pattern, updated_content)
-    if updated_match:
-        updated_count = int(updated_match.group(1))
-        assert updated_count >= initial_count + num_calls
-    else:
-        # Metric should now exist
-        assert f'bot_updates_total{{bot_id="{bot_id}"}}' in updated_content
+    updated_response = await async_client.get("/metrics")
+    updated_count = counter_value(updated_response.text, "bot_updates_total", bot_id=bot_id)
+    assert updated_count >= initial_count + num_calls
 
-def test_metrics_multiple_bots():
+def test_metrics_multiple_bots(client):
     """Test metrics tracking for multiple bots"""
-    bot_id1 = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
     bot_id2 = "11111111-1111-1111-1111-111111111111"
 
-    # Make calls to different bots
-    client.post("/preview/send", json={"bot_id": bot_id1, "text": "/start"})
+    # Make calls to different bots (demo bot via the shared /start body)
+    client.post("/preview/send", content=START_BODY, headers=JSON_HEADERS)
     client.post("/preview/send", json={"bot_id": bot_id2, "text": "/help"})
 
     # Get metrics
@@ -94,13 +77,10 @@ def test_metrics_multiple_bots():
     # Should have metrics for both bots (or at least bot_updates_total)
     assert "bot_updates_total" in content
 
-def test_metrics_latency_buckets():
+def test_metrics_latency_buckets(client):
     """Test that latency histogram has expected buckets"""
     # Make a preview call to generate latency metrics
-    client.post(
-        "/preview/send",
-        json={"bot_id": "c3b88b65-623c-41b5-a3c9-8d56fcbc4413", "text": "/start"}
-    )
+    client.post("/preview/send", content=START_BODY, headers=JSON_HEADERS)
 
     response = client.get("/metrics")
     content = response.text
@@ -116,13 +96,10 @@ def test_metrics_latency_buckets():
     # Should find at least some buckets
     assert len(found_buckets) > 0
 
-def test_metrics_histogram_structure():
+def test_metrics_histogram_structure(client):
     """Test that histogram metrics have proper structure"""
     # Make a preview call
-    client.post(
-        "/preview/send",
-        json={"bot_id": "c3b88b65-623c-41b5-a3c9-8d56fcbc4413", "text": "/start"}
-    )
+    client.post("/preview/send", content=START_BODY, headers=JSON_HEADERS)
 
     response = client.get("/metrics")
     content = response.text
@@ -142,14 +119,14 @@ def test_metrics_histogram_structure():
         # If none found, at least base metric should exist
         assert "dsl_handle_latency_ms" in content
 
-def test_metrics_content_type():
+def test_metrics_content_type(client):
     """Test that metrics endpoint returns correct content type"""
     response = client.get("/metrics")
 
     assert response.status_code == 200
     assert "text/plain" in response.headers["content-type"]
 
-def test_metrics_no_html():
+def test_metrics_no_html(client):
     """Test that metrics don't contain HTML"""
     response = client.get("/metrics")
 
@@ -159,7 +136,7 @@ def test_metrics_no_html():
     assert "<body>" not in content.lower()
     assert "</html>" not in content.lower()
 
-def test_metrics_consistent_format():
+def test_metrics_consistent_format(client):
     """Test that metrics are consistently formatted"""
     response = client.get("/metrics")
     content = response.text
@@ -188,6 +165,28 @@ def test_metrics_consistent_format():
                     assert value_part in ['+Inf', '-Inf', 'NaN']
 
 
+def test_updates_child_bound_once():
+    """Test the per-bot updates counter child is reused and feeds the exported metric"""
+    child = updates_for("bound-child-bot")
+    assert updates_for("bound-child-bot") is child
+
+    before = counter_value(generate_latest().decode(), "bot_updates_total", bot_id="bound-child-bot")
+    child.inc()
+    after = counter_value(generate_latest().decode(), "bot_updates_total", bot_id="bound-child-bot")
+    assert after == before + 1
+
+def test_errors_child_bound_once():
+    """Test error counter children are reused per (bot, where, code) label set"""
+    child = errors_for("bound-child-bot", "preview", "500")
+    assert errors_for("bound-child-bot", "preview", "500") is child
+    assert errors_for("bound-child-bot", "webhook", "500") is not child
+
+    labels = {"bot_id": "bound-child-bot", "code": "500", "where": "preview"}  # exposition order
+    before = counter_value(generate_latest().decode(), "bot_errors_total", **labels)
+    child.inc()
+    after = counter_value(generate_latest().decode(), "bot_errors_total", **labels)
+    assert after == before + 1
+
 def _get_metric(text, name):
     """Helper to extract metric family from text"""
     from prometheus_client.parser import text_string_to_metric_families
@@ -197,7 +196,7 @@ def _get_metric(text, name):
     return None
 
 
-def test_error_counters_increment(monkeypatch, demo_bot_id):
+def test_error_counters_increment(monkeypatch, demo_bot_id, client):
     """Test that error counters increment when errors occur"""
     from runtime.main import loader
 
@@ -208,10 +207,7 @@ def test_error_counters_increment(monkeypatch, demo_bot_id):
     monkeypatch.setattr(loader, "load_spec_by_bot_id", fake_load_spec)
 
     # Make request that should cause error
-    response = client.post(
-        "/preview/send",
-        json={"bot_id": demo_bot_id, "text": "/start"}
-    )
+    response = client.post("/preview/send", content=START_BODY, headers=JSON_HEADERS)
 
     # Get metrics
     metrics_response = client.get("/metrics")
@@ -225,7 +221,7 @@ def test_error_counters_increment(monkeypatch, demo_bot_id):
         assert len(error_samples) > 0
 
 
-def test_webhook_latency_histogram(demo_bot_id, tg_update):
+def test_webhook_latency_histogram(demo_bot_id, tg_update, client):
     """Test that webhook latency histogram is recorded"""
     # Make webhook request
     response = client.post(f"/tg/{demo_bot_id}", json=tg_update)
@@ -240,27 +236,18 @@ def test_webhook_latency_histogram(demo_bot_id, tg_update):
     assert "webhook_latency_ms_sum" in metrics_text
 
 
-def test_metrics_after_errors(monkeypatch, demo_bot_id):
+def test_metrics_after_errors(monkeypatch, demo_bot_id, client):
     """Test metrics are still available after errors"""
-    from runtime import dsl_engine
-
-    # Mock DSL engine to cause error
-    original_handle = dsl_engine.handle
-
     def failing_handle(*args, **kwargs):
         raise Exception("DSL error")
 
+    # Mock DSL engine to cause error (monkeypatch restores it after the test)
     monkeypatch.setattr(dsl_engine, "handle", failing_handle)
 
     # Make request that causes error
-    try:
-        client.post("/preview/send", json={"bot_id": demo_bot_id, "text": "/test"})
-    except:
-        pass
+    response = client.post("/preview/send", json={"bot_id": demo_bot_id, "text": "/test"})
+    assert response.status_code == 500
 
     # Metrics should still be accessible
     response = client.get("/metrics")
     assert response.status_code == 200
-
-    # Restore original
-    monkeypatch.setattr(dsl_engine, "handle", original_handle)
\ No newline at end of file
@@ -1,11 +1,9 @@
 """Test preview endpoint basic functionality"""
 import pytest
-from fastapi.testclient import TestClient
-from runtime.main import app
+from tests.utils import bot_reply, send_texts
 
-client = TestClient(app)
 
-def test_preview_send_start_command():
+def test_preview_send_start_command(client):
     """Test /preview/send with /start command returns greeting"""
     response = client.post(
         "/preview/send",
@@ -15,12 +13,9 @@ def test_preview_send_start_command():
         }
     )
 
-    assert response.status_code == 200
-    data = response.json()
-    assert "bot_reply" in data
-    assert "Привет" in data["bot_reply"]
+    assert "Привет" in bot_reply(response)
 
-def test_preview_send_help_command():
+def test_preview_send_help_command(client):
     """Test /preview/send with /help command"""
     response = client.post(
         "/preview/send",
@@ -30,12 +25,9 @@ def test_preview_send_help_command():
         }
     )
 
-    assert response.status_code == 200
-    data = response.json()
-    assert "bot_reply" in data
-    assert "команд" in data["bot_reply"]
+    assert "команд" in bot_reply(response)
 
-def test_preview_send_unknown_command():
+def test_preview_send_unknown_command(client):
     """Test /preview/send with unknown command returns fallback"""
     response = client.post(
         "/preview/send",
@@ -45,12 +37,9 @@ def test_preview_send_unknown_command():
         }
     )
 
-    assert response.status_code == 200
-    data = response.json()
-    assert "bot_reply" in data
-    assert data["bot_reply"] == "Не знаю эту команду"
+    assert bot_reply(response) == "Не знаю эту команду"
 
-def test_preview_send_missing_bot_id():
+def test_preview_send_missing_bot_id(client):
     """Test /preview/send with missing bot_id"""
     response = client.post(
         "/preview/send",
@@ -60,7 +49,7 @@ def test_preview_send_missing_bot_id():
     # Should return 422 for validation error
     assert response.status_code == 422
 
-def test_preview_send_missing_text():
+def test_preview_send_missing_text(client):
     """Test /preview/send with missing text"""
     response = client.post(
         "/preview/send",
@@ -70,7 +59,7 @@ def test_preview_send_missing_text():
     # Should return 422 for validation error
     assert response.status_code == 422
 
-def test_preview_send_invalid_json():
+def test_preview_send_invalid_json(client):
     """Test /preview/send with invalid JSON"""
     response = client.post(
         "/preview/send",
@@ -80,7 +69,7 @@ def test_preview_send_invalid_json():
 
     assert response.status_code == 422
 
-def test_preview_send_non_existent_bot():
+def test_preview_send_non_existent_bot(client):
     """Test /preview/send with non-existent bot ID"""
     response = client.post(
         "/preview/send",
@@ -91,11 +80,9 @@ def test_preview_send_non_existent_bot():
     )
 
     # Should still return 200 but with fallback response
-    assert response.status_code == 200
-    data = response.json()
-    assert "bot_reply" in data
+    bot_reply(response)
 
-def test_preview_send_empty_text():
+def test_preview_send_empty_text(client):
     """Test /preview/send with empty text"""
     response = client.post(
         "/preview/send",
@@ -108,7 +95,7 @@ def test_preview_send_empty_text():
     # Empty text triggers Pydantic validation error
     assert response.status_code == 422
 
-def test_preview_send_special_characters():
+def test_preview_send_special_characters(client):
     """Test /preview/send with special characters"""
     response = client.post(
         "/preview/send",
@@ -118,11 +105,9 @@ def test_preview_send_special_characters():
         }
     )
 
-    assert response.status_code == 200
-    data = response.json()
-    assert "bot_reply" in data
+    bot_reply(response)
 
-def test_preview_send_long_text():
+def test_preview_send_long_text(client):
     """Test /preview/send with very long text"""
     long_text = "a" * 1000
     response = client.post(
@@ -133,19 +118,26 @@ def test_preview_send_long_text():
         }
     )
 
-    assert response.status_code == 200
-    data = response.json()
-    assert "bot_reply" in data
+    bot_reply(response)
 
 
-def test_unknown_command(demo_bot_id):
+def test_unknown_command(demo_bot_id, client):
     """Test preview with unknown command returns fallback"""
     response = client.post(
         "/preview/send",
         json={"bot_id": demo_bot_id, "text": "/unknown"}
     )
 
-    assert response.status_code == 200
-    data = response.json()
-    assert "bot_reply" in data
-    assert data["bot_reply"].startswith("Не знаю")
\ No newline at end of file
+    assert bot_reply(response).startswith("Не знаю")
+
+@pytest.mark.anyio
+async def test_preview_send_concurrent_replies(demo_bot_id, demo_spec, async_client, stage_spec):
+    """Test concurrent /preview/send calls each get the reply to their own text"""
+    stage_spec(demo_spec)
+
+    responses = await send_texts(async_client, demo_bot_id, ["/start", "/unknown", "/start"])
+
+    replies = [bot_reply(r) for r in responses]
+    assert replies[0].startswith("Привет")
+    assert replies[1].startswith("Не знаю")
+    assert replies[2] == replies[0]
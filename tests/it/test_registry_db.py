@@ -0,0 +1,37 @@
+"""Test bot registry against the database (each test is rolled back)"""
+import pytest
+from runtime.registry import BotRegistry
+
+@pytest.mark.anyio
+async def test_create_and_get_bot(db_session):
+    """Test that a created bot can be read back in the same transaction"""
+    registry = BotRegistry()
+
+    bot = await registry.create_bot(db_session, "savepoint-bot", "SAVEPOINT_TOKEN")
+    fetched = await registry.get_bot(db_session, bot["id"])
+
+    assert fetched is not None
+    assert fetched["name"] == "savepoint-bot"
+    assert fetched["status"] == "active"
+
+@pytest.mark.anyio
+async def test_update_and_delete_bot(db_session):
+    """Test update and delete round-trip"""
+    registry = BotRegistry()
+
+    bot = await registry.create_bot(db_session, "savepoint-bot", "SAVEPOINT_TOKEN")
+
+    updated = await registry.update_bot(db_session, bot["id"], status="inactive")
+    assert updated["status"] == "inactive"
+
+    assert await registry.delete_bot(db_session, bot["id"]) is True
+    assert await registry.get_bot(db_session, bot["id"]) is None
+
+@pytest.mark.anyio
+async def test_writes_rolled_back_between_tests(db_session):
+    """Test that bots created by other tests are not visible"""
+    registry = BotRegistry()
+
+    bots = await registry.list_bots(db_session)
+
+    assert all(b["name"] != "savepoint-bot" for b in bots)
@@ -1,18 +1,18 @@
 """Test bot reload functionality"""
+import asyncio
 import pytest
-from fastapi.testclient import TestClient
-from runtime.main import app, bot_cache
+from runtime.main import bot_cache, reload_bot
+from tests.utils import raw_send
 
-client = TestClient(app)
 
-def test_reload_endpoint_basic():
-    """Test basic reload endpoint functionality"""
+def test_reload_lifecycle(client):
+    """Test reload of a cached bot, then repeated reloads of the now uncached bot"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
     # First, add something to cache to test invalidation
     bot_cache[bot_id] = {"cached": "data"}
 
-    # Call reload endpoint
+    # Reload cached bot
     response = client.post(f"/bots/{bot_id}/reload")
 
     assert response.status_code == 200
@@ -24,22 +24,28 @@ def test_reload_endpoint_basic():
     # Verify cache was cleared
     assert bot_id not in bot_cache
 
-def test_reload_non_cached_bot():
-    """Test reload endpoint for bot not in cache"""
+    # Further reloads (cache already empty) still succeed
+    for _ in range(3):
+        response = client.post(f"/bots/{bot_id}/reload")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["bot_id"] == bot_id
+        assert data["cache_invalidated"] is True
+
+def test_reload_drops_cached_spec(client):
+    """Test reload endpoint invalidates the cached spec for the bot"""
+    from runtime.dsl_engine import _bot_config_cache
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
-    # Ensure bot is not in cache
-    if bot_id in bot_cache:
-        del bot_cache[bot_id]
+    _bot_config_cache[bot_id] = {"bot_id": bot_id, "version": 1, "spec_json": {"intents": [], "flows": []}}
 
     response = client.post(f"/bots/{bot_id}/reload")
 
     assert response.status_code == 200
-    data = response.json()
-    assert data["bot_id"] == bot_id
-    assert data["cache_invalidated"] is True
+    assert bot_id not in _bot_config_cache
 
-def test_reload_invalid_bot_id():
+def test_reload_invalid_bot_id(client):
     """Test reload endpoint with invalid bot ID format"""
     invalid_bot_id = "invalid-uuid"
 
@@ -50,31 +56,7 @@ def test_reload_invalid_bot_id():
     data = response.json()
     assert data["bot_id"] == invalid_bot_id
 
-def test_multiple_reloads():
-    """Test multiple consecutive reloads"""
-    bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
-
-    # Add to cache
-    bot_cache[bot_id] = {"test": "data"}
-
-    # First reload
-    response1 = client.post(f"/bots/{bot_id}/reload")
-    assert response1.status_code == 200
-
-    # Second reload (cache already empty)
-    response2 = client.post(f"/bots/{bot_id}/reload")
-    assert response2.status_code == 200
-
-    # Third reload
-    response3 = client.post(f"/bots/{bot_id}/reload")
-    assert response3.status_code == 200
-
-    # All should succeed
-    for response in [response1, response2, response3]:
-        data = response.json()
-        assert data["cache_invalidated"] is True
-
-@pytest.mark.asyncio
+@pytest.mark.anyio
 async def test_reload_affects_preview():
     """Test that reload affects subsequent preview calls"""
     # This test would require mocking database updates
@@ -82,42 +64,34 @@ async def test_reload_affects_preview():
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
     # Get initial response
-    response1 = client.post(
-        "/preview/send",
-        json={"bot_id": bot_id, "text": "/start"}
-    )
-    initial_reply = response1.json()["bot_reply"]
+    response1 = await raw_send(bot_id, "/start")
 
     # Reload bot
-    reload_response = client.post(f"/bots/{bot_id}/reload")
-    assert reload_response.status_code == 200
+    reload_response = await reload_bot(bot_id)
+    assert reload_response["cache_invalidated"] is True
 
     # Get response after reload
-    response2 = client.post(
-        "/preview/send",
-        json={"bot_id": bot_id, "text": "/start"}
-    )
-    after_reload_reply = response2.json()["bot_reply"]
+    response2 = await raw_send(bot_id, "/start")
 
     # Both should be successful
-    assert response1.status_code == 200
-    assert response2.status_code == 200
+    assert "bot_reply" in response1
+    assert "bot_reply" in response2
 
     # Note: Without actual database changes, replies will be the same
     # In a full test, we would update the database between calls
 
-def test_reload_concurrent_access():
+@pytest.mark.anyio
+async def test_reload_concurrent_access(async_client):
     """Test reload under concurrent cache access"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
     # Simulate concurrent access by multiple operations
     bot_cache[bot_id] = {"concurrent": "test"}
 
-    # Multiple reload calls
-    responses = []
-    for i in range(5):
-        response = client.post(f"/bots/{bot_id}/reload")
-        responses.append(response)
+    # Multiple reload calls in flight at once
+    responses = await asyncio.gather(*[
+        async_client.post(f"/bots/{bot_id}/reload") for _ in range(5)
+    ])
 
     # All should succeed
     for response in responses:
@@ -127,7 +101,7 @@ def test_reload_concurrent_access():
     # Cache should be empty
     assert bot_id not in bot_cache
 
-def test_reload_different_bots():
+def test_reload_different_bots(client):
     """Test reload with different bot IDs"""
     bot_id1 = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
     bot_id2 = "11111111-1111-1111-1111-111111111111"
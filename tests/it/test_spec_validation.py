@@ -1,11 +1,25 @@
 """Test DSL spec validation"""
 import pytest
+from types import MappingProxyType
 from runtime.dsl_engine import DSLEngine
 
-def test_empty_intents_valid():
+# Shared read-only building blocks; specs below reference them instead of re-literalizing.
+# Intents are frozen so no test can leak a change into another; routes stay plain
+# because validate_jsonb_config checks for real dicts and lists
+START_INTENT = MappingProxyType({"cmd": "/start", "reply": "Hello!"})
+HELP_INTENT = MappingProxyType({"cmd": "/help", "reply": "Help message"})
+VALID_ROUTES = [
+    {"path": "/test", "method": "GET"},
+    {"path": "/api/data", "method": "POST"}
+]
+
+@pytest.fixture(scope="module")
+def dsl_engine():
+    """One engine per module - it holds no per-spec state"""
+    return DSLEngine()
+
+def test_empty_intents_valid(dsl_engine):
     """Test that empty intents array is valid"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
         "intents": [],
         "flows": []
@@ -17,15 +31,10 @@ def test_empty_intents_valid():
     assert result["router_built"] is True
     assert result["intents_count"] == 0
 
-def test_valid_intent_structure():
+def test_valid_intent_structure(dsl_engine):
     """Test valid intent structure"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
-        "intents": [
-            {"cmd": "/start", "reply": "Hello!"},
-            {"cmd": "/help", "reply": "Help message"}
-        ],
+        "intents": [START_INTENT, HELP_INTENT],
         "flows": []
     }
 
@@ -35,10 +44,8 @@ def test_valid_intent_structure():
     assert result["router_built"] is True
     assert result["intents_count"] == 2
 
-def test_intent_missing_cmd():
+def test_intent_missing_cmd(dsl_engine):
     """Test intent without cmd field"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
         "intents": [
             {"reply": "Hello!"}  # Missing cmd
@@ -52,10 +59,8 @@ def test_intent_missing_cmd():
     assert result["status"] == "ok"
     assert result["router_built"] is True
 
-def test_intent_missing_reply():
+def test_intent_missing_reply(dsl_engine):
     """Test intent without reply field"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
         "intents": [
             {"cmd": "/start"}  # Missing reply
@@ -69,14 +74,12 @@ def test_intent_missing_reply():
     assert result["status"] == "ok"
     assert result["router_built"] is True
 
-def test_invalid_intent_type():
+def test_invalid_intent_type(dsl_engine):
     """Test invalid intent type (not object)"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
         "intents": [
             "invalid_intent",  # Should be object
-            {"cmd": "/start", "reply": "Hello!"}
+            START_INTENT
         ],
         "flows": []
     }
@@ -87,15 +90,10 @@ def test_invalid_intent_type():
     assert result["status"] == "ok"
     assert result["router_built"] is True
 
-def test_jsonb_config_validation_valid():
+def test_jsonb_config_validation_valid(dsl_engine):
     """Test valid JSONB configuration validation"""
-    dsl_engine = DSLEngine()
-
     valid_config = {
-        "routes": [
-            {"path": "/test", "method": "GET"},
-            {"path": "/api/data", "method": "POST"}
-        ]
+        "routes": VALID_ROUTES
     }
 
     is_valid, message = dsl_engine.validate_jsonb_config(valid_config)
@@ -103,10 +101,8 @@ def test_jsonb_config_validation_valid():
     assert is_valid is True
     assert message == "Valid configuration"
 
-def test_jsonb_config_validation_missing_routes():
+def test_jsonb_config_validation_missing_routes(dsl_engine):
     """Test JSONB config without routes"""
-    dsl_engine = DSLEngine()
-
     config_without_routes = {
         "other": "data"
     }
@@ -116,10 +112,8 @@ def test_jsonb_config_validation_missing_routes():
     # Should be valid (routes defaults to empty list)
     assert is_valid is True
 
-def test_jsonb_config_validation_invalid_routes_type():
+def test_jsonb_config_validation_invalid_routes_type(dsl_engine):
     """Test JSONB config with invalid routes type"""
-    dsl_engine = DSLEngine()
-
     invalid_config = {
         "routes": "should_be_list"
     }
@@ -129,10 +123,8 @@ def test_jsonb_config_validation_invalid_routes_type():
     assert is_valid is False
     assert "Routes must be a list" in message
 
-def test_jsonb_config_validation_route_missing_path():
+def test_jsonb_config_validation_route_missing_path(dsl_engine):
     """Test JSONB config with route missing path"""
-    dsl_engine = DSLEngine()
-
     invalid_config = {
         "routes": [
             {"method": "GET"}  # Missing path
@@ -144,10 +136,8 @@ def test_jsonb_config_validation_route_missing_path():
     assert is_valid is False
     assert "missing required 'path' field" in message
 
-def test_jsonb_config_validation_invalid_route_type():
+def test_jsonb_config_validation_invalid_route_type(dsl_engine):
     """Test JSONB config with invalid route type"""
-    dsl_engine = DSLEngine()
-
     invalid_config = {
         "routes": [
             "invalid_route"  # Should be dict
@@ -159,10 +149,8 @@ def test_jsonb_config_validation_invalid_route_type():
     assert is_valid is False
     assert "must be a dictionary" in message
 
-def test_jsonb_config_validation_invalid_json_string():
+def test_jsonb_config_validation_invalid_json_string(dsl_engine):
     """Test JSONB config validation with invalid JSON string"""
-    dsl_engine = DSLEngine()
-
     invalid_json = "{'invalid': json}"  # Should use double quotes
 
     is_valid, message = dsl_engine.validate_jsonb_config(invalid_json)
@@ -170,10 +158,8 @@ def test_jsonb_config_validation_invalid_json_string():
     assert is_valid is False
     assert "Invalid JSON" in message
 
-def test_jsonb_config_validation_not_dict():
+def test_jsonb_config_validation_not_dict(dsl_engine):
     """Test JSONB config that's not a dictionary"""
-    dsl_engine = DSLEngine()
-
     invalid_config = ["should", "be", "dict"]
 
     is_valid, message = dsl_engine.validate_jsonb_config(invalid_config)
@@ -181,15 +167,10 @@ def test_jsonb_config_validation_not_dict():
     assert is_valid is False
     assert "Configuration must be a dictionary" in message
 
-def test_build_router_from_jsonb_valid():
+def test_build_router_from_jsonb_valid(dsl_engine):
     """Test building router from valid JSONB config"""
-    dsl_engine = DSLEngine()
-
     valid_config = {
-        "routes": [
-            {"path": "/test", "method": "GET"},
-            {"path": "/api/data", "method": "POST"}
-        ]
+        "routes": VALID_ROUTES
     }
 
     router = dsl_engine.build_router_from_jsonb(valid_config)
@@ -200,10 +181,19 @@ def test_build_router_from_jsonb_valid():
     from fastapi import APIRouter
     assert isinstance(router, APIRouter)
 
-def test_build_router_from_jsonb_invalid():
-    """Test building router from invalid JSONB config"""
-    dsl_engine = DSLEngine()
+def test_build_router_from_jsonb_methods(dsl_engine):
+    """Test each declared route is registered with its method, unknown methods skipped"""
+    routes = VALID_ROUTES + [{"path": "/skip", "method": "PATCH"}]
 
+    router = dsl_engine.build_router_from_jsonb({"routes": routes})
+
+    assert [(r.path, r.methods) for r in router.routes] == [
+        ("/test", {"GET"}),
+        ("/api/data", {"POST"})
+    ]
+
+def test_build_router_from_jsonb_invalid(dsl_engine):
+    """Test building router from invalid JSONB config"""
     invalid_config = "invalid json"
 
     router = dsl_engine.build_router_from_jsonb(invalid_config)
@@ -213,14 +203,10 @@ def test_build_router_from_jsonb_invalid():
     from fastapi import APIRouter
     assert isinstance(router, APIRouter)
 
-def test_spec_with_flows():
+def test_spec_with_flows(dsl_engine):
     """Test spec with flows field"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
-        "intents": [
-            {"cmd": "/start", "reply": "Hello!"}
-        ],
+        "intents": [START_INTENT],
         "flows": [
             {"name": "test_flow", "steps": []}
         ]
@@ -233,10 +219,8 @@ def test_spec_with_flows():
     assert result["intents_count"] == 1
     assert result["flows_count"] == 1
 
-def test_spec_missing_intents():
+def test_spec_missing_intents(dsl_engine):
     """Test spec without intents field"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
         "flows": []
     }
@@ -247,14 +231,10 @@ def test_spec_missing_intents():
     assert result["router_built"] is True
     assert result["intents_count"] == 0
 
-def test_spec_missing_flows():
+def test_spec_missing_flows(dsl_engine):
     """Test spec without flows field"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
-        "intents": [
-            {"cmd": "/start", "reply": "Hello!"}
-        ]
+        "intents": [START_INTENT]
     }
 
     result = dsl_engine.build_router_from_spec(spec_json)
@@ -263,10 +243,8 @@ def test_spec_missing_flows():
     assert result["router_built"] is True
     assert result["flows_count"] == 0
 
-def test_complex_intent_structure():
+def test_complex_intent_structure(dsl_engine):
     """Test complex intent with additional fields"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
         "intents": [
             {
@@ -286,10 +264,8 @@ def test_complex_intent_structure():
     assert result["router_built"] is True
     assert result["intents_count"] == 1
 
-def test_unicode_in_spec():
+def test_unicode_in_spec(dsl_engine):
     """Test spec with Unicode characters"""
-    dsl_engine = DSLEngine()
-
     spec_json = {
         "intents": [
             {"cmd": "/привет", "reply": "Здравствуй! 🤖"},
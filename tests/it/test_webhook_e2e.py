@@ -1,32 +1,93 @@
 """Test Telegram webhook endpoint E2E"""
+import asyncio
 import pytest
-import re
-from fastapi.testclient import TestClient
-from runtime.main import app
+from tests.utils import counter_value
 
-client = TestClient(app)
 
-def test_webhook_basic_telegram_update():
-    """Test webhook with basic Telegram update"""
-    bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
+BOT_ID = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
-    telegram_update = {
-        "update_id": 1,
+BASIC_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "text": "/start",
+        "chat": {"id": 123},
+        "from": {"id": 1}
+    }
+}
+
+# Callback query (inline button press)
+CALLBACK_QUERY_UPDATE = {
+    "update_id": 2,
+    "callback_query": {
+        "id": "callback_id",
+        "data": "button_data",
+        "from": {"id": 1},
         "message": {
             "message_id": 1,
-            "text": "/start",
-            "chat": {"id": 123},
-            "from": {"id": 1}
+            "chat": {"id": 123}
         }
     }
-
-    response = client.post(f"/tg/{bot_id}", json=telegram_update)
+}
+
+EDITED_MESSAGE_UPDATE = {
+    "update_id": 3,
+    "edited_message": {
+        "message_id": 1,
+        "text": "/start edited",
+        "chat": {"id": 123},
+        "from": {"id": 1},
+        "edit_date": 1234567890
+    }
+}
+
+# Large update with many fields
+LARGE_UPDATE = {
+    "update_id": 999,
+    "message": {
+        "message_id": 999,
+        "text": "A" * 1000,  # Large message
+        "chat": {
+            "id": 123,
+            "type": "private",
+            "username": "testuser",
+            "first_name": "Test",
+            "last_name": "User"
+        },
+        "from": {
+            "id": 1,
+            "is_bot": False,
+            "first_name": "Test",
+            "last_name": "User",
+            "username": "testuser",
+            "language_code": "en"
+        },
+        "date": 1234567890,
+        "entities": [
+            {
+                "type": "bot_command",
+                "offset": 0,
+                "length": 6
+            }
+        ]
+    }
+}
+
+@pytest.mark.parametrize("telegram_update", [
+    pytest.param(BASIC_UPDATE, id="basic"),
+    pytest.param(CALLBACK_QUERY_UPDATE, id="callback_query"),
+    pytest.param(EDITED_MESSAGE_UPDATE, id="edited_message"),
+    pytest.param({}, id="empty"),
+    pytest.param(LARGE_UPDATE, id="large"),
+])
+def test_webhook_update_kinds(client, telegram_update):
+    """Test webhook accepts each kind of Telegram update"""
+    response = client.post(f"/tg/{BOT_ID}", json=telegram_update)
 
     assert response.status_code == 200
-    data = response.json()
-    assert data == {"ok": True}
+    assert response.json() == {"ok": True}
 
-def test_webhook_different_commands():
+def test_webhook_different_commands(client):
     """Test webhook with different Telegram commands"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -48,60 +109,7 @@ def test_webhook_different_commands():
         assert response.status_code == 200
         assert response.json() == {"ok": True}
 
-def test_webhook_with_callback_query():
-    """Test webhook with callback query (inline button press)"""
-    bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
-
-    telegram_update = {
-        "update_id": 2,
-        "callback_query": {
-            "id": "callback_id",
-            "data": "button_data",
-            "from": {"id": 1},
-            "message": {
-                "message_id": 1,
-                "chat": {"id": 123}
-            }
-        }
-    }
-
-    response = client.post(f"/tg/{bot_id}", json=telegram_update)
-
-    assert response.status_code == 200
-    assert response.json() == {"ok": True}
-
-def test_webhook_with_edited_message():
-    """Test webhook with edited message"""
-    bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
-
-    telegram_update = {
-        "update_id": 3,
-        "edited_message": {
-            "message_id": 1,
-            "text": "/start edited",
-            "chat": {"id": 123},
-            "from": {"id": 1},
-            "edit_date": 1234567890
-        }
-    }
-
-    response = client.post(f"/tg/{bot_id}", json=telegram_update)
-
-    assert response.status_code == 200
-    assert response.json() == {"ok": True}
-
-def test_webhook_empty_update():
-    """Test webhook with empty update"""
-    bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
-
-    empty_update = {}
-
-    response = client.post(f"/tg/{bot_id}", json=empty_update)
-
-    assert response.status_code == 200
-    assert response.json() == {"ok": True}
-
-def test_webhook_invalid_json():
+def test_webhook_invalid_json(client):
     """Test webhook with invalid JSON"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -114,16 +122,17 @@ def test_webhook_invalid_json():
     # Should return 422 for invalid JSON
     assert response.status_code == 422
 
-def test_webhook_multiple_bots():
-    """Test webhook calls to different bots"""
+@pytest.mark.anyio
+async def test_webhook_multiple_bots(async_client):
+    """Test concurrent webhook calls to different bots"""
     bot_ids = [
         "c3b88b65-623c-41b5-a3c9-8d56fcbc4413",
         "11111111-1111-1111-1111-111111111111",
         "22222222-2222-2222-2222-222222222222"
     ]
 
-    for i, bot_id in enumerate(bot_ids):
-        telegram_update = {
+    updates = [
+        {
             "update_id": i + 10,
             "message": {
                 "message_id": i + 1,
@@ -132,85 +141,61 @@ def test_webhook_multiple_bots():
                 "from": {"id": 1 + i}
             }
         }
+        for i in range(len(bot_ids))
+    ]
 
-        response = client.post(f"/tg/{bot_id}", json=telegram_update)
+    # Bots are independent, so their updates are sent concurrently
+    responses = await asyncio.gather(*[
+        async_client.post(f"/tg/{bot_id}", json=update)
+        for bot_id, update in zip(bot_ids, updates)
+    ])
 
+    for response in responses:
         assert response.status_code == 200
         assert response.json() == {"ok": True}
 
-def test_webhook_large_update():
-    """Test webhook with large Telegram update"""
-    bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
+def test_webhook_metrics_increment(client, monkeypatch):
+    """Test that webhook calls increment metrics"""
+    import runtime.main as main
 
-    # Create large update with many fields
-    large_update = {
-        "update_id": 999,
-        "message": {
-            "message_id": 999,
-            "text": "A" * 1000,  # Large message
-            "chat": {
-                "id": 123,
-                "type": "private",
-                "username": "testuser",
-                "first_name": "Test",
-                "last_name": "User"
-            },
-            "from": {
-                "id": 1,
-                "is_bot": False,
-                "first_name": "Test",
-                "last_name": "User",
-                "username": "testuser",
-                "language_code": "en"
-            },
-            "date": 1234567890,
-            "entities": [
-                {
-                    "type": "bot_command",
-                    "offset": 0,
-                    "length": 6
-                }
-            ]
-        }
-    }
+    class NoopDispatcher:
+        async def feed_update(self, bot, update):
+            pass
 
-    response = client.post(f"/tg/{bot_id}", json=large_update)
+    async def fake_load_bot_config(bot_id):
+        return {"bot_id": bot_id, "token": "123456:TEST-token", "version": 1, "spec_json": {"intents": []}}
 
-    assert response.status_code == 200
-    assert response.json() == {"ok": True}
+    # No DB or Telegram: the request must take the success path every time
+    monkeypatch.setattr(main.dsl, "load_bot_config", fake_load_bot_config)
+    monkeypatch.setattr(main, "get_bot", lambda token: None)
+    monkeypatch.setattr(main, "get_dispatcher", lambda bot_config: NoopDispatcher())
 
-def test_webhook_metrics_increment():
-    """Test that webhook calls increment metrics"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
-    # Get initial metrics
-    initial_metrics = client.get("/metrics")
-    initial_content = initial_metrics.text
-
-    # Extract initial counter value for this bot if present
-    pattern = rf'bot_updates_total{{bot_id="{bot_id}"}} (\d+)'
-    initial_match = re.search(pattern, initial_content)
-    initial_count = int(initial_match.group(1)) if initial_match else 0
+    # Get initial counter value for this bot (0 if not yet present)
+    initial_count = counter_value(client.get("/metrics").text, "bot_updates_total", bot_id=bot_id)
 
-    # Send webhook update
+    # Send webhook update (complete enough to pass Update validation)
     telegram_update = {
         "update_id": 100,
         "message": {
             "message_id": 100,
+            "date": 1234567890,
             "text": "/start",
-            "chat": {"id": 123},
-            "from": {"id": 1}
+            "chat": {"id": 123, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"}
         }
     }
 
     webhook_response = client.post(f"/tg/{bot_id}", json=telegram_update)
     assert webhook_response.status_code == 200
+    assert webhook_response.json() == {"ok": True}
 
-    # Note: Current webhook implementation is stub and doesn't increment metrics
-    # In full implementation, we would expect metrics to increment
-    # For now, just verify webhook works
+    # Counter for this bot should have grown by exactly one
+    final_count = counter_value(client.get("/metrics").text, "bot_updates_total", bot_id=bot_id)
+    assert final_count == initial_count + 1
 
-def test_webhook_content_type():
+def test_webhook_content_type(client):
     """Test webhook accepts different content types"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -234,7 +219,7 @@ def test_webhook_content_type():
     assert response1.status_code == 200
     assert response1.json() == {"ok": True}
 
-def test_webhook_special_characters():
+def test_webhook_special_characters(client):
     """Test webhook with special characters in messages"""
     bot_id = "c3b88b65-623c-41b5-a3c9-8d56fcbc4413"
 
@@ -262,7 +247,7 @@ def test_webhook_special_characters():
         assert response.status_code == 200
         assert response.json() == {"ok": True}
 
-def test_webhook_missing_bot_id():
+def test_webhook_missing_bot_id(client):
     """Test webhook URL without bot_id"""
     # This should result in 404 since /tg/ without bot_id doesn't match route
     response = client.post("/tg/", json={"update_id": 1})
@@ -270,7 +255,7 @@ def test_webhook_missing_bot_id():
     # Should return 404 or 405 depending on FastAPI routing
     assert response.status_code in [404, 405]
 
-def test_webhook_invalid_bot_id_format():
+def test_webhook_invalid_bot_id_format(client):
     """Test webhook with invalid bot_id format"""
     invalid_bot_id = "not-a-uuid"
 
@@ -97,4 +97,123 @@ def test_malformed_spec():
     assert result["status"] == "ok"
     assert result["router_built"] is True
     assert result["intents_count"] == 0
-    assert result["flows_count"] == 0
\ No newline at end of file
+    assert result["flows_count"] == 0
+
+def test_compile_spec_once_per_spec():
+    """Test that repeated handling of one spec compiles its intents once"""
+    from runtime import dsl_engine
+
+    spec_json = {
+        "intents": [
+            {"cmd": "/a", "reply": "A"},
+            {"cmd": "/a", "reply": "shadowed"},
+            {"cmd": "/b", "reply": "B"}
+        ]
+    }
+
+    dsl_engine._compiled_specs.clear()
+    assert dsl_engine.handle_with_spec(spec_json, "/a") == "A"
+    assert dsl_engine.handle_with_spec(spec_json, "/b") == "B"
+    assert dsl_engine.handle_with_spec(spec_json, "/c") == dsl_engine.FALLBACK_REPLY
+
+    # One table built and reused for every call on this spec object
+    assert len(dsl_engine._compiled_specs) == 1
+    assert dsl_engine.compile_spec(spec_json) is dsl_engine.compile_spec(spec_json)
+
+async def router_answers(router, texts, monkeypatch):
+    """Feed texts to an aiogram router as private messages, collect what it answers"""
+    from aiogram import Bot, Dispatcher
+    from aiogram.types import Message, Update
+
+    answers = []
+
+    async def fake_answer(self, text, **kwargs):
+        answers.append(text)
+
+    monkeypatch.setattr(Message, "answer", fake_answer)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:TEST-token")
+    try:
+        for i, text in enumerate(texts):
+            update = Update.model_validate({
+                "update_id": i,
+                "message": {
+                    "message_id": i,
+                    "date": 1640995200,
+                    "text": text,
+                    "chat": {"id": 1, "type": "private"},
+                    "from": {"id": 1, "is_bot": False, "first_name": "Test"}
+                }
+            })
+            await dp.feed_update(bot, update)
+    finally:
+        await bot.session.close()
+    return answers
+
+@pytest.mark.anyio
+async def test_compile_spec_skips_malformed_intents(monkeypatch):
+    """Test that intents without string cmd/reply are reported once, in preview and webhook alike"""
+    from runtime import dsl_engine
+
+    warnings = []
+    monkeypatch.setattr(dsl_engine.log, "warning", lambda *a, **k: warnings.append(k))
+
+    spec_json = {
+        "intents": [
+            {"cmd": "/broken"},
+            {"cmd": "/nested", "reply": {"text": "no"}},
+            {"cmd": 42, "reply": "number"},
+            {"cmd": "/ok", "reply": "OK"}
+        ]
+    }
+
+    for _ in range(3):
+        assert dsl_engine.handle_with_spec(spec_json, "/broken") == dsl_engine.FALLBACK_REPLY
+        assert dsl_engine.handle_with_spec(spec_json, "/nested") == dsl_engine.FALLBACK_REPLY
+        assert dsl_engine.handle_with_spec(spec_json, "/ok") == "OK"
+
+    # The webhook router is built from the same table, so it skips the same intents
+    router = dsl_engine.build_router(spec_json)
+    assert await router_answers(router, ["/broken", "/nested", "/ok"], monkeypatch) == ["OK"]
+
+    assert [w["cmd"] for w in warnings] == ["/broken", "/nested", 42]
+
+@pytest.mark.anyio
+async def test_build_router_single_handler_dispatch(monkeypatch):
+    """Test that the aiogram router answers every intent through one dict-dispatched handler"""
+    from runtime.dsl_engine import build_router
+
+    spec_json = {
+        "intents": [
+            {"cmd": "/a", "reply": "A"},
+            {"cmd": "/a", "reply": "shadowed"},
+            {"cmd": "/b", "reply": "B"}
+        ]
+    }
+
+    router = build_router(spec_json)
+    assert len(router.message.handlers) == 1
+
+    answers = await router_answers(router, ["/a", "/b extra args", "/c", "hello"], monkeypatch)
+    assert answers == ["A", "B"]
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("username, expected", [
+    ("Demo_Bot", ["A"]),
+    (None, ["A", "A"]),
+])
+async def test_build_router_command_mentions(monkeypatch, username, expected):
+    """Test that /cmd@name must name this bot, unless the bot has no username"""
+    from aiogram import Bot
+    from aiogram.types import User
+    from runtime.dsl_engine import build_router
+
+    async def fake_me(self):
+        return User(id=123456, is_bot=True, first_name="Demo", username=username)
+
+    monkeypatch.setattr(Bot, "me", fake_me)
+
+    router = build_router({"intents": [{"cmd": "/a", "reply": "A"}]})
+    assert await router_answers(router, ["/a@demo_bot", "/a@other_bot"], monkeypatch) == expected
@@ -0,0 +1,18 @@
+"""Test mapping of unexpected exceptions to HTTP errors"""
+import pytest
+from fastapi import HTTPException
+from runtime.http_errors import fail_unexpected
+
+@pytest.mark.parametrize("exc, status, code", [
+    (Exception("Database connection refused"), 503, "db_unavailable"),
+    (Exception("psycopg: DB is starting up"), 503, "db_unavailable"),
+    (KeyError("text"), 400, "bad_request"),
+    (RuntimeError("boom"), 500, "internal"),
+])
+def test_fail_unexpected(exc, status, code):
+    """Test each exception kind maps to its status and error code"""
+    with pytest.raises(HTTPException) as info:
+        fail_unexpected(exc)
+
+    assert info.value.status_code == status
+    assert info.value.detail["error"]["code"] == code
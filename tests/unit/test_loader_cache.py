@@ -1,8 +1,8 @@
 """Test bot loader caching functionality"""
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
-from runtime.loader import BotLoader
-from runtime.main import bot_cache
+from runtime.loader import BotLoader, LATEST_SPEC_SQL
+from runtime.main import bot_cache, get_dispatcher
 
 @pytest.mark.anyio
 async def test_load_spec_by_bot_id():
@@ -75,6 +75,23 @@ async def test_load_spec_with_version():
     assert result is not None
     assert result["version"] == 2
 
+@pytest.mark.anyio
+async def test_load_spec_reuses_statement():
+    """Test that every load sends the same prebuilt statement (so it can stay prepared)"""
+    loader = BotLoader()
+
+    mock_session = AsyncMock()
+    mock_result = MagicMock()
+    mock_result.fetchone.return_value = None
+    mock_session.execute.return_value = mock_result
+
+    await loader.load_spec_by_bot_id(mock_session, "bot-a")
+    await loader.load_spec_by_bot_id(mock_session, "bot-b")
+
+    statements = [call.args[0] for call in mock_session.execute.call_args_list]
+    assert len(statements) == 2
+    assert all(stmt is LATEST_SPEC_SQL for stmt in statements)
+
 def test_bot_cache_operations():
     """Test bot cache basic operations"""
     # Clear cache first
@@ -140,4 +157,78 @@ async def test_get_bot_config_fallback():
     result = await loader.get_bot_config(mock_session, "non-existent-bot")
 
     # Should return None when bot not found in DB and no plugins
-    assert result is None
\ No newline at end of file
+    assert result is None
+
+def test_dispatcher_cached_per_spec_version(monkeypatch):
+    """Test webhook dispatcher is built once per (bot_id, version)"""
+    from cachetools import TTLCache
+    from runtime import main
+
+    # Private cache, so neither earlier entries nor these Dispatchers leak between tests
+    monkeypatch.setattr(main, "router_cache", TTLCache(maxsize=256, ttl=600))
+
+    config = {
+        "bot_id": "dispatcher-test-bot",
+        "version": 1,
+        "spec_json": {"intents": [{"cmd": "/start", "reply": "Hi"}]}
+    }
+
+    dp1 = get_dispatcher(config)
+    dp2 = get_dispatcher(config)
+    assert dp1 is dp2
+    assert "dispatcher-test-bot:1" in main.router_cache
+
+    # New spec version gets its own dispatcher
+    dp3 = get_dispatcher({**config, "version": 2})
+    assert dp3 is not dp1
+
+@pytest.mark.anyio
+async def test_load_spec_cached_until_invalidated(monkeypatch):
+    """Test that load_spec hits the loader once per bot until invalidate_spec"""
+    from runtime import dsl_engine
+
+    calls = []
+
+    async def fake_load_spec_by_bot_id(self, session, bot_id, version=None):
+        calls.append(bot_id)
+        return {"bot_id": bot_id, "version": 1, "spec_json": {"intents": [{"cmd": "/start", "reply": "Hi"}]}}
+
+    monkeypatch.setattr(BotLoader, "load_spec_by_bot_id", fake_load_spec_by_bot_id)
+    dsl_engine.invalidate_spec("spec-cache-bot")
+
+    try:
+        assert await dsl_engine.handle("spec-cache-bot", "/start") == "Hi"
+        assert await dsl_engine.handle("spec-cache-bot", "/start") == "Hi"
+        assert calls == ["spec-cache-bot"]
+
+        # Reload path drops the entry, next call reads again
+        dsl_engine.invalidate_spec("spec-cache-bot")
+        await dsl_engine.load_spec("spec-cache-bot")
+        assert calls == ["spec-cache-bot", "spec-cache-bot"]
+    finally:
+        # Do not leave the fake spec cached for later tests
+        dsl_engine.invalidate_spec("spec-cache-bot")
+
+@pytest.mark.anyio
+async def test_load_spec_single_flight(monkeypatch):
+    """Test that concurrent cache misses for one bot share a single load"""
+    import asyncio
+    from runtime import dsl_engine
+
+    calls = []
+
+    async def slow_load_spec_by_bot_id(self, session, bot_id, version=None):
+        calls.append(bot_id)
+        await asyncio.sleep(0.01)
+        return {"bot_id": bot_id, "version": 1, "spec_json": {"intents": []}}
+
+    monkeypatch.setattr(BotLoader, "load_spec_by_bot_id", slow_load_spec_by_bot_id)
+    dsl_engine.invalidate_spec("single-flight-bot")
+
+    try:
+        specs = await asyncio.gather(*[dsl_engine.load_spec("single-flight-bot") for _ in range(5)])
+
+        assert calls == ["single-flight-bot"]
+        assert all(spec is specs[0] for spec in specs)
+    finally:
+        dsl_engine.invalidate_spec("single-flight-bot")
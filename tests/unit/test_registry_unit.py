@@ -1,28 +1,30 @@
 """Test bot registry CRUD operations"""
 import pytest
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 from runtime.registry import BotRegistry
 
-@pytest.mark.anyio
-async def test_create_bot():
-    """Test creating a new bot"""
-    registry = BotRegistry()
+def bot_row(id, name, token, status):
+    """Plain stand-in for a bots table row (attribute access only)"""
+    return SimpleNamespace(id=id, name=name, token=token, status=status)
 
-    # Mock database session and result
-    mock_session = AsyncMock()
-    mock_result = MagicMock()
-    mock_bot = MagicMock()
+@pytest.fixture(scope="module")
+def registry():
+    """BotRegistry holds no state, one instance serves the module"""
+    return BotRegistry()
 
-    # Configure mock bot object
-    mock_bot.id = "test-uuid-123"
-    mock_bot.name = "test-bot"
-    mock_bot.token = "test-token"
-    mock_bot.status = "active"
+@pytest.fixture
+def mock_session():
+    """AsyncSession mock whose execute() returns mock_session.result"""
+    session = AsyncMock()
+    session.result = MagicMock()
+    session.execute.return_value = session.result
+    return session
 
-    mock_result.fetchone.return_value = mock_bot
-    mock_session.execute.return_value = mock_result
-    mock_session.commit = AsyncMock()
-    mock_session.rollback = AsyncMock()
+@pytest.mark.anyio
+async def test_create_bot(registry, mock_session):
+    """Test creating a new bot"""
+    mock_session.result.fetchone.return_value = bot_row("test-uuid-123", "test-bot", "test-token", "active")
 
     # Test bot creation
     result = await registry.create_bot(mock_session, "test-bot", "test-token")
@@ -37,14 +39,9 @@ async def test_create_bot():
     mock_session.commit.assert_called_once()
 
 @pytest.mark.anyio
-async def test_create_bot_error():
+async def test_create_bot_error(registry, mock_session):
     """Test bot creation with database error"""
-    registry = BotRegistry()
-
-    # Mock session that raises exception
-    mock_session = AsyncMock()
     mock_session.execute.side_effect = Exception("Database error")
-    mock_session.rollback = AsyncMock()
 
     # Test that exception is raised and rollback is called
     with pytest.raises(Exception, match="Database error"):
@@ -53,22 +50,9 @@ async def test_create_bot_error():
     mock_session.rollback.assert_called_once()
 
 @pytest.mark.anyio
-async def test_get_bot():
+async def test_get_bot(registry, mock_session):
     """Test getting a bot by ID"""
-    registry = BotRegistry()
-
-    # Mock database session
-    mock_session = AsyncMock()
-    mock_result = MagicMock()
-    mock_bot = MagicMock()
-
-    mock_bot.id = "test-bot-id"
-    mock_bot.name = "test-bot"
-    mock_bot.token = "test-token"
-    mock_bot.status = "active"
-
-    mock_result.fetchone.return_value = mock_bot
-    mock_session.execute.return_value = mock_result
+    mock_session.result.fetchone.return_value = bot_row("test-bot-id", "test-bot", "test-token", "active")
 
     # Test getting bot
     result = await registry.get_bot(mock_session, "test-bot-id")
@@ -80,39 +64,18 @@ async def test_get_bot():
     assert result["status"] == "active"
 
 @pytest.mark.anyio
-async def test_get_bot_not_found():
+async def test_get_bot_not_found(registry, mock_session):
     """Test getting non-existent bot"""
-    registry = BotRegistry()
-
-    # Mock session with no results
-    mock_session = AsyncMock()
-    mock_result = MagicMock()
-    mock_result.fetchone.return_value = None
-    mock_session.execute.return_value = mock_result
+    mock_session.result.fetchone.return_value = None
 
     result = await registry.get_bot(mock_session, "non-existent-id")
 
     assert result is None
 
 @pytest.mark.anyio
-async def test_update_bot():
+async def test_update_bot(registry, mock_session):
     """Test updating bot information"""
-    registry = BotRegistry()
-
-    # Mock database session
-    mock_session = AsyncMock()
-    mock_result = MagicMock()
-    mock_bot = MagicMock()
-
-    mock_bot.id = "test-bot-id"
-    mock_bot.name = "updated-bot"
-    mock_bot.token = "updated-token"
-    mock_bot.status = "inactive"
-
-    mock_result.fetchone.return_value = mock_bot
-    mock_session.execute.return_value = mock_result
-    mock_session.commit = AsyncMock()
-    mock_session.rollback = AsyncMock()
+    mock_session.result.fetchone.return_value = bot_row("test-bot-id", "updated-bot", "updated-token", "inactive")
 
     # Test updating bot
     result = await registry.update_bot(
@@ -131,13 +94,8 @@ async def test_update_bot():
     mock_session.commit.assert_called_once()
 
 @pytest.mark.anyio
-async def test_update_bot_no_changes():
+async def test_update_bot_no_changes(registry, mock_session):
     """Test updating bot with no actual changes"""
-    registry = BotRegistry()
-
-    # Mock get_bot method
-    mock_session = AsyncMock()
-
     # When no updates are provided, should call get_bot
     with patch.object(registry, 'get_bot') as mock_get_bot:
         mock_get_bot.return_value = {"id": "test-id", "name": "test"}
@@ -148,17 +106,9 @@ async def test_update_bot_no_changes():
         assert result == {"id": "test-id", "name": "test"}
 
 @pytest.mark.anyio
-async def test_delete_bot():
+async def test_delete_bot(registry, mock_session):
     """Test deleting a bot"""
-    registry = BotRegistry()
-
-    # Mock database session
-    mock_session = AsyncMock()
-    mock_result = MagicMock()  # Changed from AsyncMock
-    mock_result.rowcount = 1
-    mock_session.execute.return_value = mock_result
-    mock_session.commit = AsyncMock()
-    mock_session.rollback = AsyncMock()
+    mock_session.result.rowcount = 1
 
     # Test deleting bot
     result = await registry.delete_bot(mock_session, "test-bot-id")
@@ -167,46 +117,21 @@ async def test_delete_bot():
     mock_session.commit.assert_called_once()
 
 @pytest.mark.anyio
-async def test_delete_bot_not_found():
+async def test_delete_bot_not_found(registry, mock_session):
     """Test deleting non-existent bot"""
-    registry = BotRegistry()
-
-    # Mock session with no affected rows
-    mock_session = AsyncMock()
-    mock_result = MagicMock()  # Changed from AsyncMock
-    mock_result.rowcount = 0
-    mock_session.execute.return_value = mock_result
-    mock_session.commit = AsyncMock()
-    mock_session.rollback = AsyncMock()
+    mock_session.result.rowcount = 0
 
     result = await registry.delete_bot(mock_session, "non-existent-id")
 
     assert result is False
 
 @pytest.mark.anyio
-async def test_list_bots():
+async def test_list_bots(registry, mock_session):
     """Test listing all bots"""
-    registry = BotRegistry()
-
-    # Mock database session
-    mock_session = AsyncMock()
-    mock_result = MagicMock()
-
-    # Create mock bots
-    mock_bot1 = MagicMock()
-    mock_bot1.id = "bot-1"
-    mock_bot1.name = "Bot 1"
-    mock_bot1.token = "token-1"
-    mock_bot1.status = "active"
-
-    mock_bot2 = MagicMock()
-    mock_bot2.id = "bot-2"
-    mock_bot2.name = "Bot 2"
-    mock_bot2.token = "token-2"
-    mock_bot2.status = "inactive"
-
-    mock_result.fetchall.return_value = [mock_bot1, mock_bot2]
-    mock_session.execute.return_value = mock_result
+    mock_session.result.fetchall.return_value = [
+        bot_row("bot-1", "Bot 1", "token-1", "active"),
+        bot_row("bot-2", "Bot 2", "token-2", "inactive")
+    ]
 
     # Test listing bots
     result = await registry.list_bots(mock_session)
@@ -216,42 +141,27 @@ async def test_list_bots():
     assert result[1]["name"] == "Bot 2"
 
 @pytest.mark.anyio
-async def test_list_bots_empty():
+async def test_list_bots_empty(registry, mock_session):
     """Test listing bots when none exist"""
-    registry = BotRegistry()
-
-    # Mock session with no results
-    mock_session = AsyncMock()
-    mock_result = MagicMock()
-    mock_result.fetchall.return_value = []
-    mock_session.execute.return_value = mock_result
+    mock_session.result.fetchall.return_value = []
 
     result = await registry.list_bots(mock_session)
 
     assert result == []
 
 @pytest.mark.anyio
-async def test_db_ok():
+async def test_db_ok(registry, mock_session):
     """Test database health check"""
-    registry = BotRegistry()
-
-    # Mock successful database connection
-    mock_session = AsyncMock()
-
     result = await registry.db_ok(mock_session)
 
     assert result is True
     mock_session.execute.assert_called_once()
 
 @pytest.mark.anyio
-async def test_db_ok_failure():
+async def test_db_ok_failure(registry, mock_session):
     """Test database health check failure"""
-    registry = BotRegistry()
-
-    # Mock failed database connection
-    mock_session = AsyncMock()
     mock_session.execute.side_effect = Exception("Connection failed")
 
     result = await registry.db_ok(mock_session)
 
-    assert result is False
\ No newline at end of file
+    assert result is False
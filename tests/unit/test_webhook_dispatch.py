@@ -0,0 +1,178 @@
+"""Test background processing of webhook updates"""
+import asyncio
+import pytest
+from prometheus_client import REGISTRY
+from runtime.main import schedule_update, drain_updates, get_bot, bot_instances, router_cache
+
+class SlowDispatcher:
+    """Dispatcher stand-in whose handlers take a while"""
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.fed = []
+
+    async def feed_update(self, bot, update):
+        self.started.set()
+        await self.release.wait()
+        self.fed.append(update)
+
+class FailingDispatcher:
+    """Dispatcher stand-in whose handler raises"""
+    async def feed_update(self, bot, update):
+        raise RuntimeError("handler failed")
+
+@pytest.mark.anyio
+async def test_schedule_update_returns_before_handlers_finish():
+    """Test that scheduling an update does not wait for its handlers"""
+    dp = SlowDispatcher()
+
+    task = schedule_update("bg-test-bot", dp, None, {"update_id": 1})
+    await dp.started.wait()
+
+    # Handler is running but the caller already has control back
+    assert not task.done()
+    assert dp.fed == []
+
+    dp.release.set()
+    await task
+    assert dp.fed == [{"update_id": 1}]
+
+@pytest.mark.anyio
+async def test_schedule_update_swallows_handler_errors():
+    """Test that a failing handler is logged, not raised into the event loop"""
+    task = schedule_update("bg-test-bot", FailingDispatcher(), None, {"update_id": 2})
+
+    await task
+    assert task.exception() is None
+
+@pytest.mark.anyio
+async def test_schedule_update_rejects_when_at_capacity(monkeypatch):
+    """Test that updates past WEBHOOK_CONCURRENCY are refused instead of queued"""
+    from runtime import main
+    monkeypatch.setattr(main, "WEBHOOK_CONCURRENCY", 1)
+    handled_before = REGISTRY.get_sample_value("webhook_handle_latency_ms_count")
+
+    dp = SlowDispatcher()
+    task = schedule_update("bg-test-bot", dp, None, {"update_id": 5})
+    await dp.started.wait()
+
+    assert schedule_update("bg-test-bot", dp, None, {"update_id": 6}) is None
+
+    dp.release.set()
+    await task
+    assert dp.fed == [{"update_id": 5}]
+    assert REGISTRY.get_sample_value("webhook_handle_latency_ms_count") == handled_before + 1
+
+@pytest.mark.anyio
+async def test_webhook_returns_503_when_at_capacity(monkeypatch, async_client):
+    """Test that a full webhook queue answers 503 so Telegram redelivers"""
+    from runtime import main
+
+    async def fake_load_bot_config(bot_id):
+        return {"bot_id": bot_id, "token": "123456:TEST-token", "version": 1, "spec_json": {"intents": []}}
+
+    monkeypatch.setattr(main.dsl, "load_bot_config", fake_load_bot_config)
+    monkeypatch.setattr(main, "get_bot", lambda token: None)
+    monkeypatch.setattr(main, "get_dispatcher", lambda bot_config: SlowDispatcher())
+    monkeypatch.setattr(main, "WEBHOOK_CONCURRENCY", 0)
+
+    response = await async_client.post("/tg/full-bot", json={"update_id": 7})
+
+    assert response.status_code == 503
+    assert response.json()["detail"]["error"]["code"] == "overloaded"
+
+@pytest.mark.anyio
+async def test_drain_updates_waits_for_running_handlers():
+    """Test that shutdown drain lets acknowledged updates finish"""
+    dp = SlowDispatcher()
+    task = schedule_update("bg-test-bot", dp, None, {"update_id": 3})
+    await dp.started.wait()
+
+    asyncio.get_running_loop().call_later(0.01, dp.release.set)
+    await drain_updates(timeout=5)
+
+    assert task.done()
+    assert dp.fed == [{"update_id": 3}]
+
+@pytest.mark.anyio
+async def test_drain_updates_cancels_after_timeout():
+    """Test that drain gives up on stuck handlers instead of blocking shutdown"""
+    dp = SlowDispatcher()
+    task = schedule_update("bg-test-bot", dp, None, {"update_id": 4})
+    await dp.started.wait()
+
+    await drain_updates(timeout=0.01)
+
+    assert task.cancelled()
+    assert dp.fed == []
+
+@pytest.mark.anyio
+async def test_get_bot_reuses_instance_per_token():
+    """Test that updates for one token share a Bot and its HTTP session"""
+    token = "123456:REUSE-token"
+    bot_instances.pop(token, None)
+
+    bot = get_bot(token)
+    assert get_bot(token) is bot
+    assert get_bot("654321:OTHER-token") is not bot
+
+    for t in (token, "654321:OTHER-token"):
+        await bot_instances.pop(t).session.close()
+
+@pytest.mark.anyio
+async def test_get_bot_evicts_least_recently_used(monkeypatch):
+    """Test that the Bot pool is bounded and closes the sessions it evicts"""
+    from collections import OrderedDict
+    from runtime import main
+    monkeypatch.setattr(main, "bot_instances", OrderedDict())
+    monkeypatch.setattr(main, "BOT_INSTANCES_MAX", 2)
+
+    first, second = main.get_bot("1:LRU-token"), main.get_bot("2:LRU-token")
+    main.get_bot("1:LRU-token")  # touching the first leaves the second least recently used
+
+    closed = []
+    async def fake_close():
+        closed.append(second)
+    monkeypatch.setattr(second.session, "close", fake_close)
+
+    third = main.get_bot("3:LRU-token")
+    await asyncio.gather(*main._closing_sessions)
+
+    assert list(main.bot_instances) == ["1:LRU-token", "3:LRU-token"]
+    assert closed == [second]
+
+    for bot in (first, third):
+        await bot.session.close()
+
+@pytest.mark.anyio
+async def test_webhook_burst_shares_one_config_load(monkeypatch, async_client):
+    """Test concurrent webhook updates for one bot load its config once"""
+    from runtime import dsl_engine
+    from runtime.loader import BotLoader
+
+    calls = []
+
+    async def slow_load_spec_by_bot_id(self, session, bot_id, version=None):
+        calls.append(bot_id)
+        await asyncio.sleep(0.01)
+        return {"bot_id": bot_id, "token": "123456:TEST-token", "version": 1, "spec_json": {"intents": []}}
+
+    monkeypatch.setattr(BotLoader, "load_spec_by_bot_id", slow_load_spec_by_bot_id)
+    dsl_engine.invalidate_spec("burst-bot")
+
+    try:
+        # Updates without a message match no handler, so nothing is sent to Telegram
+        responses = await asyncio.gather(*[
+            async_client.post("/tg/burst-bot", json={"update_id": i}) for i in range(5)
+        ])
+
+        assert all(r.json() == {"ok": True} for r in responses)
+        assert calls == ["burst-bot"]
+    finally:
+        # Let background handlers finish before closing the Bot they use
+        await drain_updates()
+        bot = bot_instances.pop("123456:TEST-token", None)
+        if bot is not None:
+            await bot.session.close()
+        router_cache.pop("burst-bot:1", None)
+        dsl_engine.invalidate_spec("burst-bot")
@@ -0,0 +1,56 @@
+"""Shared helpers for tests"""
+import asyncio
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from runtime.main import preview_send
+from runtime.schemas import PreviewRequest
+
+# Demo bot /start body encoded once, for tests that only need "a /start call"
+JSON_HEADERS = {"content-type": "application/json"}
+START_BODY = json.dumps(
+    {"bot_id": "c3b88b65-623c-41b5-a3c9-8d56fcbc4413", "text": "/start"},
+    separators=(",", ":"), ensure_ascii=False
+).encode()
+
+
+def counter_value(metrics_text, name, **labels):
+    """Value of one labelled sample in Prometheus text output (0 if absent)"""
+    label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    match = re.search(rf"^{name}{{{re.escape(label_str)}}} (\S+)$", metrics_text, re.M)
+    return float(match.group(1)) if match else 0.0
+
+def bot_reply(response):
+    """bot_reply of a /preview/send response, asserting it succeeded"""
+    assert response.status_code == 200
+    data = response.json()
+    assert "bot_reply" in data
+    return data["bot_reply"]
+
+async def send_texts(ac, bot_id, texts):
+    """Send texts to /preview/send concurrently; responses come back in input order"""
+    return await asyncio.gather(*[
+        ac.post("/preview/send", json={"bot_id": bot_id, "text": text})
+        for text in texts
+    ])
+
+async def raw_send(bot_id, text):
+    """Call the /preview/send handler in-process, skipping HTTP encode/decode"""
+    return await preview_send(PreviewRequest(bot_id=bot_id, text=text))
+
+async def seed_bookings(session, bot_id, user_id, n, service="haircut"):
+    """Insert n bookings with one multi-VALUES INSERT (single round-trip)"""
+    if n <= 0:
+        return  # an empty VALUES list is a syntax error
+    base = datetime(2025, 1, 1, 10, tzinfo=timezone.utc)
+    values = ",".join(f"(:bot_id, :user_id, :service, :slot{i}, :created{i})" for i in range(n))
+    params = {"bot_id": bot_id, "user_id": user_id, "service": service}
+    for i in range(n):
+        params[f"slot{i}"] = base + timedelta(days=i)
+        params[f"created{i}"] = base + timedelta(seconds=i)
+
+    await session.execute(
+        text(f"INSERT INTO bookings(bot_id, user_id, service, slot, created_at) VALUES {values}"),
+        params
+    )